@@ -5,6 +5,8 @@ import random
 import re
 from typing import Optional
 
+from metrics import track
+
 FFMPEG_PATH = "/opt/homebrew/bin/ffmpeg"
 FFPROBE_PATH = "/opt/homebrew/bin/ffprobe" 
 AudioSegment.converter = FFMPEG_PATH
@@ -99,22 +101,24 @@ class AudioProcessor:
             music_path = str(random.choice(music_files))
             
         # Load and prepare background music
-        background_music = AudioSegment.from_mp3(music_path)
+        with track("music_decode"):
+            background_music = AudioSegment.from_mp3(music_path)
         
-        # Loop music if it's shorter than narration
-        while len(background_music) < len(narration):
-            background_music = background_music + background_music
+        with track("mixing"):
+            # Loop music if it's shorter than narration
+            while len(background_music) < len(narration):
+                background_music = background_music + background_music
+                
+            # Trim music to match narration length
+            background_music = background_music[:len(narration)]
             
-        # Trim music to match narration length
-        background_music = background_music[:len(narration)]
-        
-        # Add fade in/out effects
-        fade_duration = min(3000, len(background_music) // 2)  # 3 seconds or half duration
-        background_music = background_music.fade_in(fade_duration).fade_out(fade_duration)
-        
-        # Adjust music volume and mix
-        background_music = background_music + music_volume
-        mixed_audio = narration.overlay(background_music)
+            # Add fade in/out effects
+            fade_duration = min(3000, len(background_music) // 2)  # 3 seconds or half duration
+            background_music = background_music.fade_in(fade_duration).fade_out(fade_duration)
+            
+            # Adjust music volume and mix
+            background_music = background_music + music_volume
+            mixed_audio = narration.overlay(background_music)
         
         # Generate output path if not provided
         if output_path is None:
@@ -122,13 +126,14 @@ class AudioProcessor:
             output_path = str(Path(narration_path).parent / f"{narration_filename}_with_music.mp3")
             
         # Export mixed audio
-        mixed_audio.export(output_path, 
-        format="mp3", bitrate="320k",
-        parameters=[
-            '-codec:a', 'libmp3lame',
-            '-q:a', '0', # Highest quality
-            '-ar', '44100', # Sample rate
-            '-ac', '2', # Stereo
-            '-b:a', '192k' # Bitrate
-            ])
+        with track("audio_export"):
+            mixed_audio.export(output_path, 
+            format="mp3", bitrate="320k",
+            parameters=[
+                '-codec:a', 'libmp3lame',
+                '-q:a', '0', # Highest quality
+                '-ar', '44100', # Sample rate
+                '-ac', '2', # Stereo
+                '-b:a', '192k' # Bitrate
+                ])
         return output_path 
\ No newline at end of file
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blindtube.settings")
+# Start the in-process job workers (JOB_RUN_IN_PROCESS) in server processes only
+os.environ.setdefault("BLINDTUBE_SERVES_REQUESTS", "1")
 
 application = get_asgi_application()
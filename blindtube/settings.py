@@ -132,6 +132,97 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 AUDIO_URL = '/audio/'
 AUDIO_ROOT = os.path.join(BASE_DIR, 'audio_outputs')
 
+# Frame sampling for video descriptions (about one frame per second, capped per video)
+FRAME_SAMPLING_PER_MINUTE = 60
+FRAME_SAMPLING_MAX_FRAMES = 300
+FRAME_BUFFER_SIZE = 16  # Decoded frames allowed to wait for the request builder
+FRAME_DECODE_WORKERS = 4  # Processes used to decode long videos by segment
+FRAME_DECODE_PARALLEL_MIN_SECONDS = 300  # Shorter videos are decoded sequentially
+
+# Encoding of the frames sent to Gemini
+FRAME_MAX_DIMENSION = 768  # Longest side in pixels
+FRAME_JPEG_QUALITY = 80
+FRAME_PAYLOAD_BUDGET_BYTES = 15 * 1024 * 1024  # Frames are thinned evenly above this
+
+# Videos with more frames than this are described in windows of this many
+# frames by concurrent Gemini requests, then merged into one script
+GEMINI_SEGMENT_FRAMES = 60
+GEMINI_MAX_CONCURRENCY = 4
+
+# YouTube downloads: smallest video format at least this tall (frames are
+# downscaled to FRAME_MAX_DIMENSION anyway)
+YOUTUBE_TARGET_HEIGHT = 360
+# Fragments fetched at a time. Only fragmented (DASH/HLS) formats are split
+# into fragments; most YouTube formats are single HTTPS files and download
+# over one connection regardless
+YOUTUBE_FRAGMENT_CONCURRENCY = 4
+# Decode frames while the download is still running, falling back to the
+# finished file when the container cannot be read as a stream
+YOUTUBE_PROGRESSIVE_DECODE = True
+
+# Disk cache of downloaded YouTube videos, keyed by video ID and format, so
+# repeat requests skip the network
+YOUTUBE_CACHE_ENABLED = True
+YOUTUBE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'youtube_cache')
+YOUTUBE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # Least recently used videos are evicted above this
+
+# Disk cache of frames and descriptions, keyed by video hash or YouTube ID
+DESCRIPTION_CACHE_ENABLED = True
+DESCRIPTION_CACHE_DIR = os.path.join(MEDIA_ROOT, 'description_cache')
+DESCRIPTION_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used entries are evicted above this
+
+# Background processing jobs (ProcessingJob table as the queue)
+JOB_WORKERS = 2  # Worker threads per process
+JOB_POLL_INTERVAL = 1.0  # Seconds between queue checks when idle
+JOB_RUN_IN_PROCESS = True  # Run workers inside the web process, from startup; set False when using run_job_workers
+NARRATION_TTS_CONCURRENCY = 2  # Paragraphs of one narration job synthesized at once
+HUME_CHUNK_CONCURRENCY = 4  # Chunks of one Hume request synthesized at once
+JOB_HEARTBEAT_INTERVAL = 10  # Seconds between heartbeats of running jobs
+JOB_STALE_SECONDS = 60  # Running jobs without a heartbeat for this long are requeued
+JOB_MAX_ATTEMPTS = 3  # Interrupted jobs are failed after this many claims
+JOB_CHECKPOINT_DIR = os.path.join(MEDIA_ROOT, 'job_checkpoints')  # Frames kept for resuming jobs
+
+# Fair scheduling of queued jobs (see descriptions/scheduling.py): share of
+# claims per lane when both have work, and per-user weights (default 1)
+JOB_LANE_WEIGHTS = {'interactive': 4, 'bulk': 1}
+JOB_USER_WEIGHTS = {}
+JOB_INTERACTIVE_MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # Larger uploads default to the bulk lane
+JOB_INTERACTIVE_RESERVED = 1  # Workers per pool that only claim interactive jobs (at least one worker takes any lane)
+
+# Drop near-duplicate frames (static shots) before calling Gemini
+KEYFRAME_SELECTION_ENABLED = True
+KEYFRAME_DIFF_THRESHOLD = 0.03  # Mean pixel difference (0-1) needed to keep a frame
+KEYFRAME_MAX_FRAMES = 120
+
+# Admission control: concurrent slots and waiting requests allowed per stage
+# in each worker process. Requests beyond the queue, or that wait longer than
+# ADMISSION_WAIT_TIMEOUT seconds, get a 503 with a Retry-After header.
+STAGE_LIMITS = {
+    'decode': {'concurrency': 2, 'queue': 4},
+    'gemini': {'concurrency': 4, 'queue': 8},
+    'tts': {'concurrency': 4, 'queue': 8},
+    'mix': {'concurrency': 2, 'queue': 4},
+}
+ADMISSION_WAIT_TIMEOUT = 10
+
+# Outbound AI API calls: per-provider token bucket (calls started per second,
+# burst size) and concurrent calls, per worker process. Waiting calls are
+# served earliest deadline first; request views give theirs a deadline of
+# OUTBOUND_INTERACTIVE_DEADLINE seconds, ahead of background jobs.
+OUTBOUND_QUOTAS = {
+    'gemini': {'rate': 2.0, 'burst': 4, 'concurrency': 4},
+    'hume': {'rate': 2.0, 'burst': 4, 'concurrency': 4},
+    'eleven_labs': {'rate': 1.0, 'burst': 2, 'concurrency': 2},
+    'gtts': {'rate': 2.0, 'burst': 4, 'concurrency': 4},
+}
+OUTBOUND_INTERACTIVE_DEADLINE = 30
+
+# Request profiling for staff users: send the header "X-Profile: 1", or set
+# PROFILE_ADMIN_REQUESTS to profile every staff request to the profiled views
+PROFILE_ADMIN_REQUESTS = False
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')  # Kept out of MEDIA_ROOT, which is served publicly; gitignored
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between samples for the collapsed stacks
+
 # Create necessary directories
 os.makedirs(STATIC_ROOT, exist_ok=True)
 os.makedirs(MEDIA_ROOT, exist_ok=True)
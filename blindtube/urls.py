@@ -20,10 +20,12 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
+from descriptions.views import stage_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('descriptions.urls')),
+    path('metrics', stage_metrics, name='metrics'),
     path('', TemplateView.as_view(template_name='app.html'), name='home'),
     path('description_detail.html', TemplateView.as_view(template_name='description_detail.html'), name='description_detail'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+class DescriptionCache:
+    """
+    Content-addressed disk cache for extracted frames and generated descriptions.
+
+    Each entry is a directory named after its key holding `meta.json` (the
+    description text plus metadata) and the frames as numbered JPEG files.
+    Entries are written to a temporary directory and renamed into place, so
+    readers never see a half-written entry. The modification time of
+    `meta.json` is refreshed on every hit and the least recently used entries
+    are evicted once the cache grows past `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str = "media/description_cache", max_bytes: int = 512 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries, created on the first `put`
+            max_bytes: Maximum total size of the cache on disk
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source_id: str, params: Dict[str, Any]) -> str:
+        """
+        Build a cache key from the video identity and the processing parameters.
+
+        Args:
+            source_id: Content hash of the video file or its YouTube video ID
+            params: Extraction parameters, prompt version and anything else that changes the output
+
+        Returns:
+            Hex digest identifying the cache entry
+        """
+        payload = json.dumps({"source": source_id, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached description without loading its frames.
+
+        Args:
+            key: Key built by `make_key`
+
+        Returns:
+            Dict with `description_text` and `metadata`, or None on a miss
+        """
+        meta_file = self._entry_dir(key) / "meta.json"
+        try:
+            with open(meta_file, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(meta_file)  # Mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return entry
+
+    def put(
+        self,
+        key: str,
+        description_text: str,
+        frames: List[bytes],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Store a description and its frame set, then evict old entries if needed.
+
+        Args:
+            key: Key built by `make_key`
+            description_text: Generated description
+            frames: JPEG encoded frames sent to Gemini
+            metadata: Extra JSON-serializable data returned with the entry (optional)
+        """
+        temp_dir = self.cache_dir / f".tmp-{uuid.uuid4()}"
+        temp_dir.mkdir(parents=True)
+        try:
+            for i, frame in enumerate(frames):
+                (temp_dir / f"{i:05d}.jpg").write_bytes(frame)
+            with open(temp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "description_text": description_text,
+                    "metadata": metadata or {},
+                    "created_at": time.time(),
+                }, f)
+
+            entry_dir = self._entry_dir(key)
+            try:
+                os.replace(temp_dir, entry_dir)
+            except OSError:
+                if (entry_dir / "meta.json").exists():
+                    # Another worker stored the same key first; keep its entry
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                else:
+                    # A broken leftover entry; replace it
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    os.replace(temp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`.
+
+        Returns:
+            Number of entries removed
+        """
+        if not self.cache_dir.is_dir():
+            return 0
+        with self._lock:
+            entries = []
+            total = 0
+            for entry_dir in self.cache_dir.iterdir():
+                meta_file = entry_dir / "meta.json"
+                if entry_dir.name.startswith("."):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in entry_dir.iterdir())
+                    entries.append((meta_file.stat().st_mtime, size, entry_dir))
+                except FileNotFoundError:
+                    continue  # Removed by another worker in the meantime
+                total += size
+
+            removed = 0
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                removed += 1
+            return removed
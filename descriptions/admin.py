@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AudioDescription
+from .models import AudioDescription, ProcessingJob
 
 @admin.register(AudioDescription)
 class AudioDescriptionAdmin(admin.ModelAdmin):
@@ -7,3 +7,10 @@ class AudioDescriptionAdmin(admin.ModelAdmin):
     list_filter = ('input_type', 'description_length', 'created_at')
     search_fields = ('input_text', 'description_text', 'audio_url', 'user_id')
     readonly_fields = ('created_at',)
+
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'status', 'lane', 'stage', 'progress', 'attempts', 'user_id', 'created_at', 'finished_at')
+    list_filter = ('job_type', 'status', 'lane', 'stage', 'created_at')
+    search_fields = ('id', 'input_text', 'user_id')
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at')
@@ -0,0 +1,195 @@
+"""
+Per-stage concurrency limits and admission control for the heavy endpoints.
+
+Each stage (decode, gemini, tts, mix) gets a fixed number of slots and a
+bounded wait queue. Requests that find the queue full, or that wait longer
+than ADMISSION_WAIT_TIMEOUT, are rejected with StageOverloaded so the view
+can answer 503 with a Retry-After hint instead of piling more work onto
+the box. Background jobs wait for a slot without a queue limit.
+
+Limits apply per worker process.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+class StageOverloaded(Exception):
+    """A stage is at capacity; `retry_after` is a suggested wait in seconds."""
+    def __init__(self, stage, retry_after):
+        super().__init__(f"Server is busy ({stage} at capacity), retry in {retry_after} seconds")
+        self.stage = stage
+        self.retry_after = retry_after
+
+class _Waiter:
+    """A caller queued for a slot; `grant` hands it the slot and returns False if it is gone."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def grant(self, limiter):
+        if self.loop is None:
+            self.granted = True
+            return True
+        try:
+            self.loop.call_soon_threadsafe(limiter._resolve, self.future)
+        except RuntimeError:
+            return False  # The caller's event loop has closed
+        return True
+
+class StageLimiter:
+    """
+    Counting semaphore with a bounded number of waiters.
+
+    A released slot is handed straight to the longest waiting caller.
+    Threads wait on a condition; coroutines wait on a future resolved from
+    `release`, so a queued async caller holds no thread.
+    """
+
+    DEFAULT_DURATION = 5.0  # Seconds assumed per slot before any have completed
+
+    def __init__(self, stage, concurrency, queue_size, wait_timeout):
+        self.stage = stage
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self._waiters = deque()
+        self._avg_duration = None
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Estimate how long until a new request would get a slot."""
+        duration = self._avg_duration or self.DEFAULT_DURATION
+        return max(1, math.ceil(duration * (self.waiting + 1) / self.concurrency))
+
+    def _enqueue(self, waiter, blocking):
+        """Take a free slot (returns True) or queue `waiter`; call with the lock held."""
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            return True
+        if not blocking and self.waiting >= self.queue_size:
+            raise StageOverloaded(self.stage, self.retry_after())
+        self._waiters.append(waiter)
+        return False
+
+    def acquire(self, blocking=False):
+        """
+        Take a slot. Unless `blocking`, raise StageOverloaded when the wait
+        queue is full or no slot frees up within `wait_timeout`.
+        """
+        waiter = _Waiter()
+        with self._cond:
+            if self._enqueue(waiter, blocking):
+                return
+            deadline = None if blocking else time.monotonic() + self.wait_timeout
+            while not waiter.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    retry_after = self.retry_after()
+                    self._waiters.remove(waiter)
+                    raise StageOverloaded(self.stage, retry_after)
+                self._cond.wait(remaining)
+
+    async def aacquire(self, blocking=False):
+        """Async `acquire`; waiting for a busy stage does not hold a thread."""
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._cond:
+            if self._enqueue(waiter, blocking):
+                return
+            retry_after = self.retry_after()
+        try:
+            await asyncio.wait_for(waiter.future, None if blocking else self.wait_timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            with self._cond:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued and waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # Granted just as we stopped waiting; a cancelled future is handled by _resolve
+            if isinstance(e, asyncio.TimeoutError):
+                raise StageOverloaded(self.stage, retry_after) from None
+            raise
+
+    def _resolve(self, future):
+        """Deliver a granted slot on the waiter's event loop, or pass it on if the waiter gave up."""
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def try_acquire(self):
+        """Take a free slot without waiting; False if none is free or others are queued."""
+        with self._cond:
+            if self.active < self.concurrency and not self._waiters:
+                self.active += 1
+                return True
+            return False
+
+    def release(self, duration=None):
+        """Free a slot and fold its duration (if it was used) into the Retry-After estimate."""
+        with self._cond:
+            if duration is not None:
+                if self._avg_duration is None:
+                    self._avg_duration = duration
+                else:
+                    self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+            while self._waiters:
+                if self._waiters.popleft().grant(self):
+                    self._cond.notify_all()
+                    return
+            self.active -= 1
+
+    @contextmanager
+    def slot(self, blocking=False):
+        self.acquire(blocking)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def aslot(self, blocking=False):
+        """Async `slot`."""
+        await self.aacquire(blocking)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(stage):
+    """Return the process-wide limiter for a stage, configured from STAGE_LIMITS."""
+    with _limiters_lock:
+        if stage not in _limiters:
+            limits = settings.STAGE_LIMITS[stage]
+            _limiters[stage] = StageLimiter(
+                stage,
+                concurrency=limits['concurrency'],
+                queue_size=limits['queue'],
+                wait_timeout=settings.ADMISSION_WAIT_TIMEOUT
+            )
+        return _limiters[stage]
+
+def stage_slot(stage, blocking=False):
+    """Context manager holding one slot of `stage` for the duration of the block."""
+    return get_limiter(stage).slot(blocking)
+
+def astage_slot(stage, blocking=False):
+    """Async context manager holding one slot of `stage`."""
+    return get_limiter(stage).aslot(blocking)
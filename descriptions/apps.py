@@ -0,0 +1,34 @@
+import os
+import sys
+
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class DescriptionsConfig(AppConfig):
+    name = 'descriptions'
+
+    def ready(self):
+        # Resume jobs left queued or running by the previous process instead
+        # of waiting for the next submit_job to start the workers
+        if settings.JOB_RUN_IN_PROCESS and serves_requests():
+            from .jobs import get_worker_pool
+            get_worker_pool().start()
+
+
+# Set by blindtube/asgi.py and blindtube/wsgi.py, which only servers import
+SERVES_REQUESTS_ENV = 'BLINDTUBE_SERVES_REQUESTS'
+
+
+def serves_requests():
+    """
+    Whether this process serves web requests: one loaded through the
+    project's ASGI/WSGI module, or the runserver process that handles
+    requests (not its autoreloader parent). Management commands, test
+    runners and scripts that call django.setup() do not.
+    """
+    if os.environ.get(SERVES_REQUESTS_ENV) == '1':
+        return True
+    if len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
@@ -0,0 +1,378 @@
+"""
+Background job queue for video processing, backed by the ProcessingJob table.
+
+Jobs are submitted as 'queued' rows. Worker threads claim them with a
+conditional update, so any number of workers in any number of processes
+can share the table without an outside broker.
+
+Each finished stage is checkpointed on the job row, and running jobs send a
+heartbeat. When a worker dies, recover_jobs puts its jobs back in the queue
+and the next worker resumes them from their last checkpoint.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from text_to_speech_factory import TTSProvider
+
+from .models import AudioDescription, ProcessingJob
+from .pipeline import (
+    PipelineError, describe_video, description_cache, fetch_youtube_frames, fetch_youtube_video, narrate_video
+)
+from .scheduling import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+class JobProgress:
+    """Record the current stage, progress and per-stage timings of a job."""
+
+    def __init__(self, job):
+        self.job = job
+        self._stage_start = None
+
+    def enter(self, stage, progress):
+        """Close the timing of the previous stage and start a new one."""
+        self.finish_stage()
+        self.job.stage = stage
+        self.job.progress = progress
+        self._stage_start = time.time()
+        self.job.save(update_fields=['stage', 'progress', 'timings'])
+
+    def finish_stage(self):
+        if self._stage_start is not None:
+            self.job.timings[self.job.stage] = round(time.time() - self._stage_start, 3)
+            self._stage_start = None
+
+class JobCheckpoints:
+    """
+    Store the output of each finished stage so a retried job can skip it.
+
+    Small values go in the job's `checkpoints` field. The frame set is too
+    large for the row, so its JPEGs are written to JOB_CHECKPOINT_DIR and
+    only the directory is recorded.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.frames_dir = os.path.join(settings.JOB_CHECKPOINT_DIR, str(job.id))
+
+    def load(self):
+        """Return the checkpoints in the form the pipeline's `resume` expects."""
+        resume = dict(self.job.checkpoints)
+        frames_dir = resume.pop('frames_dir', None)
+        if frames_dir and os.path.isdir(frames_dir):
+            resume['frames'] = [path.read_bytes() for path in sorted(Path(frames_dir).glob('*.jpg'))]
+        return resume
+
+    def save(self, name, value):
+        """Record a stage's output; used as the pipeline's `on_checkpoint`."""
+        if name == 'frames':
+            shutil.rmtree(self.frames_dir, ignore_errors=True)
+            os.makedirs(self.frames_dir)
+            for i, frame in enumerate(value):
+                Path(self.frames_dir, f"{i:05d}.jpg").write_bytes(frame)
+            name, value = 'frames_dir', self.frames_dir
+        self.job.checkpoints[name] = value
+        self.job.save(update_fields=['checkpoints'])
+
+    def discard(self):
+        """Remove the files kept for resuming once the job has finished."""
+        shutil.rmtree(self.frames_dir, ignore_errors=True)
+
+def run_job(job):
+    """
+    Run every stage of a claimed job and store its outcome on the job row.
+
+    '_audio' job types go on to narrate the description through
+    narrate_video, which overlaps speech synthesis with generation.
+
+    A job claimed again after a crash resumes from its last checkpoint.
+    """
+    progress = JobProgress(job)
+    checkpoints = JobCheckpoints(job)
+    start = time.time()
+    source_type = job.job_type.split('_')[0]
+    narrate = job.job_type.endswith('_audio')
+    try:
+        resume = checkpoints.load()
+        if resume:
+            logger.debug(f"Resuming job {job.id} (attempt {job.attempts}) after: {', '.join(resume)}")
+        metadata = {}
+        title = resume.get('title', job.input_text)
+        cached = description_cache.get(job.cache_key) if job.cache_key and settings.DESCRIPTION_CACHE_ENABLED else None
+
+        if source_type == 'youtube':
+            if cached:
+                title = cached['metadata'].get('title', 'Untitled Video')
+                job.video_path = cached['metadata'].get('video_path')
+            elif 'title' in resume and os.path.exists(os.path.join(settings.MEDIA_ROOT, job.video_path)):
+                logger.debug(f"Reusing video downloaded by an earlier attempt: {job.video_path}")
+            else:
+                progress.enter('download', 10)
+                if settings.YOUTUBE_PROGRESSIVE_DECODE:
+                    video_path, title, image_parts = fetch_youtube_frames(job.input_text)
+                    frames = [part['data'] for part in image_parts]
+                    checkpoints.save('frames', frames)
+                    resume['frames'] = frames
+                else:
+                    video_path, title = fetch_youtube_video(job.input_text)
+                if not os.path.exists(video_path):
+                    raise PipelineError('download', 'Failed to download video - file not created')
+                job.video_path = os.path.relpath(video_path, settings.MEDIA_ROOT)
+                job.save(update_fields=['video_path'])
+                checkpoints.save('title', title)
+            metadata = {'title': title, 'video_path': job.video_path}
+
+        video_path = os.path.join(settings.MEDIA_ROOT, job.video_path) if job.video_path else None
+        if narrate:
+            provider = TTSProvider(job.tts_provider) if job.tts_provider else None
+            outcome = narrate_video(
+                video_path, provider, job.cache_key, metadata, on_stage=progress.enter,
+                resume=resume, on_checkpoint=checkpoints.save
+            )
+        else:
+            outcome = describe_video(
+                video_path, job.cache_key, metadata, on_stage=progress.enter,
+                resume=resume, on_checkpoint=checkpoints.save
+            )
+
+        progress.enter('saving_to_database', 90)
+        description = AudioDescription.objects.filter(id=resume.get('description_id')).first()
+        if description is None:
+            description = AudioDescription.objects.create(
+                input_text=title,
+                input_type=source_type,
+                description_text=outcome['description_text'],
+                description_length='medium',
+                audio_url=os.path.basename(outcome['audio_path']) if narrate else None,
+                user_id=job.user_id
+            )
+            checkpoints.save('description_id', description.id)
+        progress.finish_stage()
+
+        job.status = 'succeeded'
+        job.stage = 'completed'
+        job.progress = 100
+        job.description = description
+        job.result = {
+            'title': title,
+            'description': outcome['description_text'],
+            'description_id': description.id,
+            'video_path': job.video_path,
+            'frames_processed': outcome['frames_processed'],
+            'payload_bytes': outcome['payload_bytes'],
+            'description_length': len(outcome['description_text']),
+            'cached': outcome['cached'],
+        }
+        if narrate:
+            job.result.update({
+                'audio_url': description.audio_url,
+                'provider_used': outcome['provider'],
+                'paragraphs': outcome['paragraphs'],
+            })
+    except Exception as e:
+        logger.error(f"Job {job.id} failed in stage {job.stage}: {str(e)}", exc_info=True)
+        progress.finish_stage()
+        job.status = 'failed'
+        job.error = str(e)
+        if isinstance(e, PipelineError):
+            job.stage = e.stage
+
+    job.timings['total'] = round(time.time() - start, 3)
+    job.finished_at = timezone.now()
+    # Only write the outcome if the job is still this attempt's; after a
+    # missed heartbeat another worker may have reclaimed it
+    owned = ProcessingJob.objects.filter(id=job.id, status='running', attempts=job.attempts).update(
+        status=job.status, stage=job.stage, progress=job.progress, video_path=job.video_path,
+        description=job.description, result=job.result, error=job.error, timings=job.timings,
+        finished_at=job.finished_at
+    )
+    if not owned:
+        logger.warning(f"Job {job.id} was reclaimed during attempt {job.attempts}; dropping its {job.status} outcome")
+        return
+    checkpoints.discard()
+    logger.debug(f"Job {job.id} {job.status} in {job.timings['total']:.2f} seconds")
+
+def claim_next_job(lanes=None):
+    """
+    Atomically move the next queued job to 'running' and return it, in the
+    order set by the fair scheduler (see scheduling.py). `lanes` limits the
+    claim to those lanes. Returns None if there is nothing to claim.
+    """
+    scheduler = get_scheduler()
+    queued = ProcessingJob.objects.filter(status='queued')
+    if lanes is not None:
+        queued = queued.filter(lane__in=lanes)
+    lanes = set(queued.order_by().values_list('lane', flat=True).distinct())
+    if not lanes:
+        return None
+    for lane in scheduler.lane_order(lanes):
+        for job_id in scheduler.candidates(lane):
+            # Only one worker can win the conditional update for a given job
+            now = timezone.now()
+            claimed = ProcessingJob.objects.filter(id=job_id, status='queued').update(
+                status='running', started_at=now, heartbeat_at=now, attempts=F('attempts') + 1
+            )
+            if claimed:
+                job = ProcessingJob.objects.get(id=job_id)
+                scheduler.charge(lane, job.user_id)
+                return job
+    return None
+
+def recover_jobs():
+    """
+    Requeue running jobs whose worker stopped sending heartbeats, so they
+    resume from their last checkpoint. Jobs already claimed JOB_MAX_ATTEMPTS
+    times are failed instead. Returns the number of jobs requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale = ProcessingJob.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    requeued = 0
+    for job in stale:
+        # The heartbeat condition keeps two recovering workers from both acting on the job
+        orphan = ProcessingJob.objects.filter(id=job.id, status='running', heartbeat_at=job.heartbeat_at)
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            orphan.update(
+                status='failed',
+                error=f"Worker stopped during stage {job.stage} on each of {job.attempts} attempts",
+                finished_at=timezone.now()
+            )
+            logger.warning(f"Job {job.id} failed after {job.attempts} interrupted attempts")
+        elif orphan.update(status='queued'):
+            logger.warning(f"Requeued job {job.id} interrupted in stage {job.stage}")
+            requeued += 1
+    return requeued
+
+class JobWorkerPool:
+    """
+    A fixed set of threads that claim and run queued jobs, plus one thread
+    that refreshes the heartbeat of the running jobs and recovers jobs
+    orphaned by dead workers. The first `interactive_reserved` workers only
+    claim interactive jobs; at least one worker always takes any lane.
+    """
+
+    def __init__(self, workers=2, poll_interval=1.0, interactive_reserved=0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.interactive_reserved = max(0, min(interactive_reserved, workers - 1))
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads; does nothing if they are already running."""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                lanes = ('interactive',) if i < self.interactive_reserved else None
+                thread = threading.Thread(target=self._work, args=(lanes,), name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+            logger.debug(f"Started {self.workers} job workers, {self.interactive_reserved} reserved for interactive jobs")
+
+    def stop(self, timeout=None):
+        """Ask the workers to exit after their current job and wait for them."""
+        with self._lock:
+            self._stop.set()
+            self._wake.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def notify(self):
+        """Wake idle workers to look for new jobs now instead of at the next poll."""
+        self._wake.set()
+
+    def _work(self, lanes=None):
+        while not self._stop.is_set():
+            job = None
+            try:
+                job = claim_next_job(lanes)
+                if job is not None:
+                    with self._running_lock:
+                        self._running.add(job.id)
+                    run_job(job)
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}", exc_info=True)
+            finally:
+                if job is not None:
+                    with self._running_lock:
+                        self._running.discard(job.id)
+                close_old_connections()
+
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _heartbeat(self):
+        last_recovery = None
+        while not self._stop.is_set():
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                if running:
+                    ProcessingJob.objects.filter(id__in=running, status='running').update(heartbeat_at=timezone.now())
+                # Recover at startup, then periodically for workers in other processes
+                if last_recovery is None or time.monotonic() - last_recovery >= settings.JOB_STALE_SECONDS:
+                    last_recovery = time.monotonic()
+                    if recover_jobs():
+                        self.notify()
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {str(e)}", exc_info=True)
+            finally:
+                close_old_connections()
+            self._stop.wait(settings.JOB_HEARTBEAT_INTERVAL)
+
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    """Return this process's job worker pool, creating it from settings on first use."""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = JobWorkerPool(settings.JOB_WORKERS, settings.JOB_POLL_INTERVAL, settings.JOB_INTERACTIVE_RESERVED)
+        return _worker_pool
+
+def submit_job(job_type, input_text, user_id, video_path=None, cache_key=None, tts_provider=None, lane='bulk'):
+    """
+    Queue a processing job and return it without waiting for it to run.
+
+    `video_path` is the saved upload for 'video' jobs; 'youtube' jobs take the
+    URL as `input_text` and download it in the worker. `tts_provider` only
+    applies to the '_audio' job types. `lane` is 'interactive' or 'bulk'.
+    """
+    job = ProcessingJob.objects.create(
+        job_type=job_type,
+        input_text=input_text,
+        user_id=user_id,
+        video_path=os.path.relpath(video_path, settings.MEDIA_ROOT) if video_path else None,
+        cache_key=cache_key,
+        tts_provider=tts_provider,
+        lane=lane
+    )
+    if settings.JOB_RUN_IN_PROCESS:
+        pool = get_worker_pool()
+        pool.start()
+        pool.notify()
+    return job
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from descriptions.jobs import JobWorkerPool
+
+
+class Command(BaseCommand):
+    help = "Run background workers that process queued video jobs until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.JOB_WORKERS,
+            help="Number of worker threads (default: JOB_WORKERS setting)",
+        )
+
+    def handle(self, *args, **options):
+        pool = JobWorkerPool(options["workers"], settings.JOB_POLL_INTERVAL, settings.JOB_INTERACTIVE_RESERVED)
+        pool.start()
+        self.stdout.write(f"Running {options['workers']} job workers. Press Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping job workers...")
+            pool.stop()
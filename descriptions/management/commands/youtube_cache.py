@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from descriptions.pipeline import media_cache
+
+
+class Command(BaseCommand):
+    help = "List the cached YouTube downloads, or purge or evict them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purge",
+            action="store_true",
+            help="Delete cached downloads (all of them, or those of --video-id)",
+        )
+        parser.add_argument(
+            "--video-id",
+            help="Only purge the downloads of this YouTube video ID",
+        )
+        parser.add_argument(
+            "--evict",
+            action="store_true",
+            help="Evict least recently used downloads until the cache fits YOUTUBE_CACHE_MAX_BYTES",
+        )
+
+    def handle(self, *args, **options):
+        if options["purge"]:
+            removed = media_cache.remove(options["video_id"])
+            self.stdout.write(f"Removed {removed} cached downloads.")
+            return
+        if options["evict"]:
+            removed = media_cache.evict()
+            self.stdout.write(f"Evicted {removed} cached downloads.")
+            return
+
+        entries = media_cache.entries()
+        now = time.time()
+        for entry in reversed(entries):
+            metadata = entry["metadata"]
+            self.stdout.write(
+                f"{entry['video_id']}  format {entry['format_id']}  {entry['size'] / 1024 / 1024:.1f} MB  "
+                f"used {(now - entry['last_used']) / 3600:.1f} h ago  "
+                f"{metadata.get('duration') or '?'} s  {metadata.get('title', '')}"
+            )
+        total = sum(entry["size"] for entry in entries)
+        self.stdout.write(
+            f"{len(entries)} cached downloads, {total / 1024 / 1024:.1f} MB of "
+            f"{media_cache.max_bytes / 1024 / 1024:.0f} MB in {media_cache.cache_dir}"
+        )
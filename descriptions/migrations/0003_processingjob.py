@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:34
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("descriptions", "0002_audiodescription_audio_url"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessingJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("job_type", models.CharField(max_length=20)),
+                ("status", models.CharField(choices=[("queued", "Queued"), ("running", "Running"), ("succeeded", "Succeeded"), ("failed", "Failed")], default="queued", max_length=20)),
+                ("stage", models.CharField(default="queued", max_length=50)),
+                ("progress", models.IntegerField(default=0)),
+                ("input_text", models.CharField(max_length=500)),
+                ("video_path", models.CharField(blank=True, max_length=500, null=True)),
+                ("cache_key", models.CharField(blank=True, max_length=64, null=True)),
+                ("user_id", models.CharField(max_length=255)),
+                ("timings", models.JSONField(blank=True, default=dict)),
+                ("result", models.JSONField(blank=True, default=dict)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("description", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to="descriptions.audiodescription")),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [models.Index(fields=["status", "created_at"], name="description_status_fa0ff1_idx")],
+            },
+        ),
+    ]
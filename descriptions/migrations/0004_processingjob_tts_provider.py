@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("descriptions", "0003_processingjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="tts_provider",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
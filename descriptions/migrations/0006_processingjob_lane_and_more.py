@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("descriptions", "0005_processingjob_attempts_processingjob_checkpoints_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="lane",
+            field=models.CharField(choices=[("interactive", "Interactive"), ("bulk", "Bulk")], default="bulk", max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name="processingjob",
+            index=models.Index(fields=["status", "lane", "user_id", "created_at"], name="description_status_fb7c2b_idx"),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 
 # Create your models here.
@@ -16,3 +18,47 @@ class AudioDescription(models.Model):
 
     def __str__(self):
         return f"{self.input_type}: {self.input_text} ({self.description_length})"
+
+class ProcessingJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    LANE_CHOICES = [
+        ('interactive', 'Interactive'),
+        ('bulk', 'Bulk'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job_type = models.CharField(max_length=20)  # 'video' or 'youtube', with '_audio' to also narrate
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    lane = models.CharField(max_length=20, choices=LANE_CHOICES, default='bulk')  # Scheduling lane, see scheduling.py
+    stage = models.CharField(max_length=50, default='queued')  # Stage currently running
+    progress = models.IntegerField(default=0)  # Percent complete
+    input_text = models.CharField(max_length=500)  # Uploaded file name or YouTube URL
+    video_path = models.CharField(max_length=500, null=True, blank=True)  # Saved or downloaded video
+    cache_key = models.CharField(max_length=64, null=True, blank=True)  # Description cache key of the source video
+    tts_provider = models.CharField(max_length=20, null=True, blank=True)  # Narration jobs; recommended if empty
+    user_id = models.CharField(max_length=255)
+    timings = models.JSONField(default=dict, blank=True)  # Seconds spent in each stage
+    checkpoints = models.JSONField(default=dict, blank=True)  # Output of each finished stage, for resuming
+    attempts = models.IntegerField(default=0)  # Times a worker has claimed the job
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Refreshed while a worker is running the job
+    result = models.JSONField(default=dict, blank=True)  # Response payload once succeeded
+    error = models.TextField(null=True, blank=True)
+    description = models.ForeignKey(AudioDescription, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'lane', 'user_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} job {self.id} ({self.status}: {self.stage})"
@@ -0,0 +1,686 @@
+"""
+Processing stages shared by the request views and the background job workers.
+"""
+
+import logging
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import yt_dlp
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pydub import AudioSegment
+
+from audio_processor import AudioProcessor
+from description_cache import DescriptionCache
+from media_cache import MediaCache
+from metrics import track
+from text_to_speech_factory import TTSFactory, get_recommended_provider
+from video_processing import (
+    FrameBuffer, GrowingFilePipe, IncompleteStreamError, KeyframeSelector, VideoProcessor, get_shared_processor
+)
+
+from .admission import astage_slot, stage_slot
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Cache of extracted frames and generated descriptions, keyed by video content
+description_cache = DescriptionCache(
+    cache_dir=settings.DESCRIPTION_CACHE_DIR,
+    max_bytes=settings.DESCRIPTION_CACHE_MAX_BYTES
+)
+
+# Mixes narration with background music for narration jobs and generate_audio
+audio_processor = AudioProcessor()
+
+# Downloaded YouTube videos, keyed by video ID and format
+media_cache = MediaCache(
+    cache_dir=settings.YOUTUBE_CACHE_DIR,
+    max_bytes=settings.YOUTUBE_CACHE_MAX_BYTES
+)
+
+# Concurrent requests for the same video share one download and one description;
+# download_flights is keyed by video ID whether or not frames are decoded on the way
+download_flights = SingleFlight()
+frame_flights = SingleFlight()
+description_flights = SingleFlight()
+
+YOUTUBE_ID_PATTERN = re.compile(r'(?:v=|/shorts/|/embed/|/live/|youtu\.be/)([A-Za-z0-9_-]{11})')
+
+class PipelineError(Exception):
+    """A processing stage failed; `stage` names the stage for status reporting."""
+    def __init__(self, stage, message):
+        super().__init__(message)
+        self.stage = stage
+
+def youtube_video_id(url):
+    """Extract the canonical video ID from a YouTube URL, or None if it has none."""
+    match = YOUTUBE_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+def description_cache_key(source_id):
+    """
+    Cache key for a video: its identity plus every setting that changes the
+    extracted frames or the generated text.
+    """
+    return description_cache.make_key(source_id, {
+        'prompt_version': VideoProcessor.PROMPT_VERSION,
+        'model': VideoProcessor.MODEL_NAME,
+        'frames_per_minute': settings.FRAME_SAMPLING_PER_MINUTE,
+        'max_frames': settings.FRAME_SAMPLING_MAX_FRAMES,
+        'max_dimension': settings.FRAME_MAX_DIMENSION,
+        'jpeg_quality': settings.FRAME_JPEG_QUALITY,
+        'payload_budget': settings.FRAME_PAYLOAD_BUDGET_BYTES,
+        'keyframes': settings.KEYFRAME_SELECTION_ENABLED,
+        'keyframe_threshold': settings.KEYFRAME_DIFF_THRESHOLD,
+        'keyframe_max_frames': settings.KEYFRAME_MAX_FRAMES,
+        'segment_frames': settings.GEMINI_SEGMENT_FRAMES,
+    })
+
+def get_video_processor(api_key):
+    """Get the worker's shared VideoProcessor, created with the frame encoding settings."""
+    return get_shared_processor(
+        api_key=api_key,
+        max_dimension=settings.FRAME_MAX_DIMENSION,
+        jpeg_quality=settings.FRAME_JPEG_QUALITY,
+        payload_budget=settings.FRAME_PAYLOAD_BUDGET_BYTES
+    )
+
+@track('frame_extraction')
+def build_frame_parts(processor, video_path):
+    """
+    Stream sampled frames from a video into Gemini image parts.
+
+    Frames are decoded on a background thread into a bounded FrameBuffer and
+    optionally passed through keyframe selection, so peak memory depends on
+    the frame budget rather than on the length of the video.
+    """
+    frames = processor.iter_frames(
+        video_path,
+        frame_interval=10,
+        frames_per_minute=settings.FRAME_SAMPLING_PER_MINUTE,
+        max_frames=settings.FRAME_SAMPLING_MAX_FRAMES,
+        workers=settings.FRAME_DECODE_WORKERS,
+        parallel_min_seconds=settings.FRAME_DECODE_PARALLEL_MIN_SECONDS
+    )
+    return image_parts_from_frames(processor, frames)
+
+@track('frame_extraction')
+def build_stream_frame_parts(processor, source, fps, duration):
+    """
+    build_frame_parts for a stream that cannot seek, such as a pipe fed by a
+    download in progress. Raises IncompleteStreamError if the stream cannot
+    be decoded to the end.
+    """
+    frames = processor.iter_stream_frames(
+        source,
+        fps=fps,
+        duration=duration,
+        frame_interval=10,
+        frames_per_minute=settings.FRAME_SAMPLING_PER_MINUTE,
+        max_frames=settings.FRAME_SAMPLING_MAX_FRAMES
+    )
+    return image_parts_from_frames(processor, frames)
+
+def image_parts_from_frames(processor, frames):
+    """Buffer decoded frames, pick keyframes if enabled and build the Gemini image parts."""
+    with FrameBuffer(frames, maxsize=settings.FRAME_BUFFER_SIZE) as buffer:
+        if settings.KEYFRAME_SELECTION_ENABLED:
+            selector = KeyframeSelector(
+                threshold=settings.KEYFRAME_DIFF_THRESHOLD,
+                max_frames=settings.KEYFRAME_MAX_FRAMES
+            )
+            image_parts = processor.build_image_parts(selector.select(buffer))
+            logger.debug(f"Keyframe selection kept {len(image_parts)} of {buffer.count} frames")
+        else:
+            image_parts = processor.build_image_parts(buffer)
+    logger.debug(f"Frame payload: {len(image_parts)} frames, "
+                 f"{processor.payload_size(image_parts) / 1024:.1f} KB")
+    return image_parts
+
+def generate_description(processor, image_parts):
+    """Describe the frames in one request, or in parallel windows for long videos."""
+    return processor.generate_description_segmented(
+        image_parts,
+        window_size=settings.GEMINI_SEGMENT_FRAMES,
+        max_concurrency=settings.GEMINI_MAX_CONCURRENCY
+    )
+
+def describe_video(video_path, cache_key=None, metadata=None, on_stage=None, blocking=True,
+                   resume=None, on_checkpoint=None):
+    """
+    Extract frames from a saved video and generate its description, using the cache.
+
+    `on_stage(stage, progress)` is called as each stage starts. Returns a dict
+    with `description_text`, `frames_processed`, `payload_bytes`, `cached`
+    and `shared`. Raises PipelineError if no frames or no text could be produced.
+
+    Concurrent calls with the same `cache_key` wait for the first one and
+    get its result with `shared` set. Background workers wait for stage
+    slots (`blocking`); request views pass False so a saturated stage raises
+    StageOverloaded instead. Only calls with the same `blocking` share work,
+    so a job never inherits a view's StageOverloaded and a view never waits
+    without limit on a job.
+
+    `on_checkpoint(name, value)` receives the output of each finished stage
+    ('frames', 'description'); passing those values back as `resume` skips
+    the stages they cover.
+    """
+    resume = resume or {}
+    if resume.get('description'):
+        return {**resume['description'], 'shared': False}
+    if not cache_key:
+        return {**_describe_video(video_path, None, metadata, on_stage, blocking, resume, on_checkpoint), 'shared': False}
+    result, shared = description_flights.do(
+        (cache_key, blocking), lambda: _describe_video(video_path, cache_key, metadata, on_stage, blocking, resume, on_checkpoint)
+    )
+    if shared:
+        logger.debug(f"Shared description result for {cache_key}")
+    return {**result, 'shared': shared}
+
+def _describe_video(video_path, cache_key, metadata, on_stage, blocking, resume, on_checkpoint):
+    cached = description_cache.get(cache_key) if cache_key and settings.DESCRIPTION_CACHE_ENABLED else None
+    if cached:
+        logger.debug(f"Description cache hit for {cache_key}")
+        return cached_result(cached)
+
+    if on_stage:
+        on_stage('frame_extraction', 30)
+    processor = get_video_processor(settings.GOOGLE_API_KEY)
+    image_parts = _frame_parts(processor, video_path, blocking, resume, on_checkpoint)
+
+    if on_stage:
+        on_stage('description_generation', 50)
+    with stage_slot('gemini', blocking=blocking):
+        description_text = generate_description(processor, image_parts)
+    if not description_text:
+        raise PipelineError('description_generation', 'Failed to generate description')
+
+    result = store_description(processor, image_parts, description_text, cache_key, metadata)
+    if on_checkpoint:
+        on_checkpoint('description', result)
+    return result
+
+def _frame_parts(processor, video_path, blocking, resume, on_checkpoint):
+    """Decode the frames of a video, or rebuild them from a 'frames' checkpoint."""
+    if resume.get('frames'):
+        logger.debug(f"Resuming with {len(resume['frames'])} checkpointed frames")
+        return processor.build_image_parts(resume['frames'])
+    with stage_slot('decode', blocking=blocking):
+        image_parts = build_frame_parts(processor, video_path)
+    if not image_parts:
+        raise PipelineError('frame_extraction', 'Failed to extract frames from video')
+    if on_checkpoint:
+        on_checkpoint('frames', [part['data'] for part in image_parts])
+    return image_parts
+
+def cached_result(cached):
+    """describe_video's result dict for a description cache entry."""
+    return {
+        'description_text': cached['description_text'],
+        'frames_processed': cached['metadata'].get('frames_processed'),
+        'payload_bytes': cached['metadata'].get('payload_bytes'),
+        'cached': True
+    }
+
+async def adescribe_video(video_path, cache_key=None, metadata=None, image_parts=None):
+    """
+    Async version of describe_video for async views, with non-blocking stage slots.
+
+    Gemini requests are awaited on the event loop; decoding and cache I/O run
+    in the default thread pool. Shares in-flight work with non-blocking
+    describe_video calls.
+    Pass `image_parts` when the frames were already extracted (see
+    afetch_youtube_frames) to skip decoding.
+    """
+    if not cache_key:
+        return {**await _adescribe_video(video_path, None, metadata, image_parts), 'shared': False}
+    result, shared = await description_flights.ado(
+        (cache_key, False), lambda: _adescribe_video(video_path, cache_key, metadata, image_parts)
+    )
+    if shared:
+        logger.debug(f"Shared description result for {cache_key}")
+    return {**result, 'shared': shared}
+
+async def _adescribe_video(video_path, cache_key, metadata, image_parts):
+    cached = None
+    if cache_key and settings.DESCRIPTION_CACHE_ENABLED:
+        cached = await sync_to_async(description_cache.get, thread_sensitive=False)(cache_key)
+    if cached:
+        logger.debug(f"Description cache hit for {cache_key}")
+        return cached_result(cached)
+
+    processor = get_video_processor(settings.GOOGLE_API_KEY)
+    if image_parts is None:
+        async with astage_slot('decode'):
+            image_parts = await sync_to_async(build_frame_parts, thread_sensitive=False)(processor, video_path)
+    if not image_parts:
+        raise PipelineError('frame_extraction', 'Failed to extract frames from video')
+
+    async with astage_slot('gemini'):
+        description_text = await processor.generate_description_async(
+            image_parts,
+            window_size=settings.GEMINI_SEGMENT_FRAMES,
+            max_concurrency=settings.GEMINI_MAX_CONCURRENCY
+        )
+    if not description_text:
+        raise PipelineError('description_generation', 'Failed to generate description')
+
+    return await sync_to_async(store_description, thread_sensitive=False)(
+        processor, image_parts, description_text, cache_key, metadata
+    )
+
+def store_description(processor, image_parts, description_text, cache_key=None, metadata=None):
+    """
+    Cache a freshly generated description and return describe_video's result dict.
+    Caching is best effort: a failed write is logged and the description still returned.
+    """
+    result = {
+        'description_text': description_text,
+        'frames_processed': len(image_parts),
+        'payload_bytes': processor.payload_size(image_parts),
+        'cached': False
+    }
+    if cache_key and settings.DESCRIPTION_CACHE_ENABLED:
+        try:
+            description_cache.put(cache_key, description_text, [part['data'] for part in image_parts], {
+                **(metadata or {}),
+                'frames_processed': result['frames_processed'],
+                'payload_bytes': result['payload_bytes'],
+            })
+        except Exception as e:
+            logger.warning(f"Could not cache description {cache_key}: {str(e)}", exc_info=True)
+    return result
+
+def iter_paragraphs(chunks):
+    """Regroup streamed text chunks into complete, non-empty paragraphs."""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        *paragraphs, pending = re.split(r'\n\s*\n', pending)
+        for paragraph in paragraphs:
+            if paragraph.strip():
+                yield paragraph.strip()
+    if pending.strip():
+        yield pending.strip()
+
+def synthesize_paragraph(text, provider, filename):
+    """Speak one paragraph into AUDIO_ROOT, holding a TTS slot while the provider works."""
+    with stage_slot('tts', blocking=True):
+        return TTSFactory.text_to_speech(
+            text=text,
+            provider=provider,
+            output_dir=settings.AUDIO_ROOT,
+            filename=filename
+        )
+
+def narrate_video(video_path, provider=None, cache_key=None, metadata=None, on_stage=None,
+                  resume=None, on_checkpoint=None):
+    """
+    Describe a saved video and turn the description into narration mixed with music.
+
+    Gemini's output is streamed and split into paragraphs; each paragraph is
+    handed to TTS as soon as it is complete, so speech for the opening is
+    synthesized while the rest of the script is still being generated. The
+    paragraph clips are joined in order and mixed by AudioProcessor.
+
+    `provider` defaults to the recommendation for the first paragraph, so the
+    whole narration uses one voice. Returns describe_video's dict plus
+    `audio_path`, `provider` and `paragraphs`.
+
+    Checkpoints work as in describe_video, with 'narration' and 'mixed_path'
+    added after the speech and mixing stages.
+    """
+    resume = resume or {}
+    narration = resume.get('narration')
+    mixed_path = resume.get('mixed_path')
+    if mixed_path and os.path.exists(mixed_path):
+        description = resume['description']
+    elif narration and os.path.exists(narration['path']):
+        description = resume['description']
+    else:
+        description, narration = _speak_description(
+            video_path, provider, cache_key, metadata, on_stage, resume, on_checkpoint
+        )
+
+    if not (mixed_path and os.path.exists(mixed_path)):
+        if on_stage:
+            on_stage('mixing', 80)
+        with stage_slot('mix', blocking=True):
+            mixed_path = audio_processor.mix_audio(
+                narration_path=narration['path'],
+                narration_text=description['description_text']
+            )
+        if on_checkpoint:
+            on_checkpoint('mixed_path', mixed_path)
+
+    return {
+        **description,
+        'audio_path': mixed_path,
+        'provider': narration['provider'],
+        'paragraphs': narration['paragraphs']
+    }
+
+def _speak_description(video_path, provider, cache_key, metadata, on_stage, resume, on_checkpoint):
+    """
+    Produce the description and its narration clip, overlapping TTS with
+    generation. Returns the description dict and the narration checkpoint.
+    """
+    description = resume.get('description')
+    if description is None:
+        cached = description_cache.get(cache_key) if cache_key and settings.DESCRIPTION_CACHE_ENABLED else None
+        if cached:
+            logger.debug(f"Description cache hit for {cache_key}")
+            description = cached_result(cached)
+
+    if description:
+        paragraphs = iter_paragraphs([description['description_text']])
+        gemini_slot = nullcontext()
+    else:
+        if on_stage:
+            on_stage('frame_extraction', 30)
+        processor = get_video_processor(settings.GOOGLE_API_KEY)
+        image_parts = _frame_parts(processor, video_path, True, resume, on_checkpoint)
+        paragraphs = iter_paragraphs(processor.stream_description(
+            image_parts,
+            window_size=settings.GEMINI_SEGMENT_FRAMES,
+            max_concurrency=settings.GEMINI_MAX_CONCURRENCY
+        ))
+        gemini_slot = stage_slot('gemini', blocking=True)
+
+    if on_stage:
+        on_stage('description_generation', 50)
+    name = uuid.uuid4()
+    texts = []
+    clips = []
+    try:
+        with ThreadPoolExecutor(max_workers=settings.NARRATION_TTS_CONCURRENCY) as executor:
+            with gemini_slot:
+                for i, paragraph in enumerate(paragraphs):
+                    if provider is None:
+                        provider = get_recommended_provider(paragraph)
+                    texts.append(paragraph)
+                    clips.append(executor.submit(synthesize_paragraph, paragraph, provider, f"{name}_part{i:03d}.mp3"))
+            if not texts:
+                raise PipelineError('description_generation', 'Failed to generate description')
+
+            if description is None:
+                description = store_description(processor, image_parts, '\n\n'.join(texts), cache_key, metadata)
+                if on_checkpoint:
+                    on_checkpoint('description', description)
+
+            if on_stage:
+                on_stage('speech_synthesis', 70)
+            clip_paths = [clip.result() for clip in clips]
+
+        narration_audio = AudioSegment.empty()
+        for path in clip_paths:
+            narration_audio += AudioSegment.from_mp3(path)
+        narration_path = os.path.join(settings.AUDIO_ROOT, f"{name}_audio.mp3")
+        with track('audio_export'):
+            narration_audio.export(narration_path, format="mp3")
+    finally:
+        for clip in clips:
+            if clip.done() and not clip.exception() and os.path.exists(clip.result()):
+                os.remove(clip.result())
+
+    narration = {'path': narration_path, 'provider': provider.value, 'paragraphs': len(texts)}
+    if on_checkpoint:
+        on_checkpoint('narration', narration)
+    return description, narration
+
+class YouTubeDownloadError(Exception):
+    """yt-dlp could not download a video; carries the formats it found."""
+    def __init__(self, message, available_formats=None):
+        super().__init__(message)
+        self.available_formats = available_formats or []
+
+def select_video_format(formats, target_height):
+    """
+    Pick the format to sample frames from: the smallest video-bearing format
+    at least `target_height` tall, or the tallest one if none is.
+
+    Among formats of that height, video-only streams beat muxed ones (the
+    audio would be wasted bytes) and AV1 comes last, since OpenCV builds
+    often cannot decode it; then the smallest file wins.
+    """
+    videos = [f for f in formats if f.get('vcodec') != 'none' and f.get('height')]
+    if not videos:
+        # Direct links often come without codec or size; yt-dlp lists formats worst first
+        unknown = [f for f in formats if f.get('vcodec') != 'none']
+        return unknown[0] if unknown else None
+    above = [f for f in videos if f['height'] >= target_height]
+    height = min(f['height'] for f in above) if above else max(f['height'] for f in videos)
+
+    def cost(f):
+        return (
+            (f.get('vcodec') or '').startswith('av01'),
+            f.get('acodec') not in (None, 'none'),
+            f.get('filesize') or f.get('filesize_approx') or float('inf'),
+            f.get('tbr') or float('inf')
+        )
+    return min((f for f in videos if f['height'] == height), key=cost)
+
+@track('youtube_download')
+def download_youtube_video(youtube_url, progress_hook=None):
+    """
+    Download a YouTube video into MEDIA_ROOT/videos using yt-dlp.
+    Returns the path of the downloaded file and the video title.
+
+    The page is resolved once: yt-dlp calls select_video_format while
+    extracting, then downloads the chosen format. Fragmented (DASH/HLS)
+    formats are fetched YOUTUBE_FRAGMENT_CONCURRENCY fragments at a time;
+    plain HTTPS formats, which most YouTube formats are, use one connection.
+
+    `progress_hook` is added to yt-dlp's progress hooks. With a hook the
+    file is written in place rather than to a .part file, so it can be
+    read while it grows.
+
+    Videos with a YouTube ID are stored in the media cache (see
+    cached_youtube_video); other URLs get a unique file in MEDIA_ROOT/videos.
+    """
+    video_id = youtube_video_id(youtube_url)
+    use_cache = bool(video_id) and settings.YOUTUBE_CACHE_ENABLED
+    filename = 'video.mp4' if use_cache else f"{uuid.uuid4()}.mp4"
+    if use_cache:
+        download_dir = media_cache.reserve()
+    else:
+        # Create videos directory if it doesn't exist
+        download_dir = os.path.join(settings.MEDIA_ROOT, 'videos')
+        os.makedirs(download_dir, exist_ok=True)
+    output_path = os.path.join(download_dir, filename)
+
+    formats = []
+
+    def choose_format(ctx):
+        formats.extend(ctx['formats'])
+        chosen = select_video_format(ctx['formats'], settings.YOUTUBE_TARGET_HEIGHT)
+        if chosen is not None:
+            logger.debug(f"Selected format {chosen.get('format_id')} - {chosen.get('width')}x{chosen.get('height')} "
+                         f"{chosen.get('vcodec')} ({chosen.get('filesize') or chosen.get('filesize_approx') or 'unknown'} bytes)")
+            yield chosen
+
+    def my_hook(d):
+        if d['status'] == 'finished':
+            logger.debug('Download complete')
+
+    # Configure yt-dlp options
+    ydl_opts = {
+        'format': choose_format,
+        'outtmpl': output_path,
+        'progress_hooks': [my_hook] + ([progress_hook] if progress_hook else []),
+        'nopart': progress_hook is not None,
+        'concurrent_fragment_downloads': settings.YOUTUBE_FRAGMENT_CONCURRENCY,
+        'quiet': True,
+        'noprogress': True,
+        'no_warnings': False,
+    }
+
+    # Resolve and download in one pass
+    logger.debug(f"Starting download of YouTube video: {youtube_url}")
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            try:
+                info = ydl.extract_info(youtube_url, download=True)
+            except yt_dlp.utils.DownloadError as e:
+                logger.error(f"Download error: {str(e)}")
+                raise YouTubeDownloadError(
+                    str(e),
+                    [f"{f.get('format_id', 'N/A')} - {f.get('width', 'N/A')}x{f.get('height', 'N/A')}" for f in formats]
+                )
+    except BaseException:
+        if use_cache:
+            media_cache.discard(download_dir)
+        raise
+
+    video_title = info.get('title', 'Untitled Video')
+    logger.debug(f"Video title: {video_title}")
+    if use_cache:
+        output_path = media_cache.commit(download_dir, video_id, info.get('format_id'), filename, {
+            'title': video_title,
+            'duration': info.get('duration'),
+            'height': info.get('height'),
+            'target_height': settings.YOUTUBE_TARGET_HEIGHT,
+            'url': youtube_url,
+        })
+    return output_path, video_title
+
+def cached_youtube_video(youtube_url):
+    """
+    Path and title of a cached download of a YouTube video, or None.
+
+    Entries are only used if they were selected for the current
+    YOUTUBE_TARGET_HEIGHT, so a hit never needs to resolve the page.
+    """
+    video_id = youtube_video_id(youtube_url)
+    if not (video_id and settings.YOUTUBE_CACHE_ENABLED):
+        return None
+    entry = media_cache.find(video_id, {'target_height': settings.YOUTUBE_TARGET_HEIGHT})
+    if entry is None:
+        return None
+    logger.debug(f"Media cache hit for YouTube video {video_id}: {entry['key']}")
+    return entry['path'], entry['metadata'].get('title', 'Untitled Video')
+
+def fetch_youtube_video(youtube_url):
+    """
+    Download a YouTube video, sharing the download with any concurrent
+    request for the same video ID. Returns the same as download_youtube_video.
+    """
+    cached = cached_youtube_video(youtube_url)
+    if cached:
+        return cached
+    return shared_download(youtube_url)
+
+def shared_download(youtube_url, progress_hook=None):
+    """
+    Run download_youtube_video, or join the download of the same video ID
+    that is already running. Only the caller that starts the download gets
+    `progress_hook` calls.
+    """
+    video_id = youtube_video_id(youtube_url)
+    if not video_id:
+        return download_youtube_video(youtube_url, progress_hook=progress_hook)
+    (output_path, video_title), shared = download_flights.do(
+        video_id, lambda: download_youtube_video(youtube_url, progress_hook=progress_hook)
+    )
+    if shared:
+        logger.debug(f"Shared download of YouTube video {video_id}")
+    return output_path, video_title
+
+async def afetch_youtube_video(youtube_url):
+    """
+    Async version of fetch_youtube_video. yt-dlp has no async API, so the
+    download itself runs in the default thread pool.
+    """
+    cached = await sync_to_async(cached_youtube_video, thread_sensitive=False)(youtube_url)
+    if cached:
+        return cached
+    download = sync_to_async(download_youtube_video, thread_sensitive=False)
+    video_id = youtube_video_id(youtube_url)
+    if not video_id:
+        return await download(youtube_url)
+    (output_path, video_title), shared = await download_flights.ado(video_id, lambda: download(youtube_url))
+    if shared:
+        logger.debug(f"Shared download of YouTube video {video_id}")
+    return output_path, video_title
+
+
+def fetch_youtube_frames(youtube_url, blocking=True):
+    """
+    Download a YouTube video and extract its frames, decoding while the
+    download is still running. Returns the path of the downloaded file, the
+    video title and the Gemini image parts. A video in the media cache is
+    decoded from disk without a download.
+
+    Concurrent requests for the same video ID share the work, and the
+    download is shared with fetch_youtube_video callers too. Holds a decode
+    slot for the whole download (`blocking` as in describe_video).
+    """
+    video_id = youtube_video_id(youtube_url)
+    if not video_id:
+        return _fetch_youtube_frames(youtube_url, blocking)
+    result, shared = frame_flights.do(video_id, lambda: _fetch_youtube_frames(youtube_url, blocking))
+    if shared:
+        logger.debug(f"Shared frames of YouTube video {video_id}")
+    return result
+
+def _fetch_youtube_frames(youtube_url, blocking):
+    processor = get_video_processor(settings.GOOGLE_API_KEY)
+    cached = cached_youtube_video(youtube_url)
+    with stage_slot('decode', blocking=blocking):
+        if cached:
+            output_path, video_title = cached
+            image_parts = build_frame_parts(processor, output_path)
+        else:
+            output_path, video_title, image_parts = _download_and_decode(processor, youtube_url)
+    if not image_parts:
+        raise PipelineError('frame_extraction', 'Failed to extract frames from video')
+    return output_path, video_title, image_parts
+
+def _download_and_decode(processor, youtube_url):
+    """
+    Run the download on a helper thread and feed the file it writes through
+    a GrowingFilePipe into the frame decoder. If the stream cannot be
+    decoded to the end (e.g. an MP4 whose index comes last) or the download
+    finishes before reporting progress (as when joining a download that is
+    already running), frames are extracted from the finished file instead.
+    """
+    started = threading.Event()
+    progress = {}
+
+    def on_progress(d):
+        if d['status'] == 'downloading' and not started.is_set():
+            info = d.get('info_dict') or {}
+            progress.update(path=d.get('filename'), fps=info.get('fps'), duration=info.get('duration'))
+            started.set()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        download = executor.submit(shared_download, youtube_url, progress_hook=on_progress)
+        while not started.wait(0.1) and not download.done():
+            pass
+
+        image_parts = None
+        if started.is_set() and progress['path']:
+            with GrowingFilePipe(progress['path']) as pipe:
+                download.add_done_callback(lambda _: pipe.finish())
+                try:
+                    image_parts = build_stream_frame_parts(processor, pipe.path, progress['fps'], progress['duration'])
+                except IncompleteStreamError as e:
+                    logger.debug(f"Decoding during download failed, using the finished file: {e}")
+
+        output_path, video_title = download.result()
+    if not image_parts:
+        image_parts = build_frame_parts(processor, output_path)
+    return output_path, video_title, image_parts
+
+async def afetch_youtube_frames(youtube_url):
+    """
+    Async version of fetch_youtube_frames with a non-blocking decode slot;
+    the download and decoder run in the default thread pool.
+    """
+    return await sync_to_async(fetch_youtube_frames, thread_sensitive=False)(youtube_url, blocking=False)
@@ -0,0 +1,192 @@
+"""
+Opt-in profiling of individual requests, for admins only.
+
+A staff user sends `X-Profile: 1` (or PROFILE_ADMIN_REQUESTS is on) and the
+view runs under cProfile, a stack sampler and tracemalloc. The report is
+written to PROFILE_DIR/<profile id>/ and the id comes back in the
+X-Profile-Id response header:
+
+    summary.json       request, duration and peak traced memory
+    profile.prof       cProfile stats, for pstats or snakeviz
+    profile.txt        the top functions by cumulative time
+    stacks.collapsed   sampled stacks in the collapsed format read by
+                       flamegraph.pl and speedscope
+
+Only the thread running the view is profiled: work handed to thread pools
+shows up as time spent waiting for it, and for async views other requests
+on the same event loop are mixed in. The peak traced memory is
+process-wide: tracemalloc counts allocations from every thread, so requests
+running at the same time add to it. One request per process is profiled
+at a time; others that ask meanwhile run normally.
+"""
+
+import asyncio
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_FILES = ('summary.json', 'profile.prof', 'profile.txt', 'stacks.collapsed')
+
+_profile_lock = threading.Lock()
+
+class StackSampler:
+    """Sample the call stack of one thread at a fixed interval and count each distinct stack."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """The samples as `frame;frame;frame count` lines, outermost frame first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+class RequestProfile:
+    """Profiling state for one request, from `start` to `save`."""
+
+    def __init__(self, request):
+        self.id = str(uuid.uuid4())
+        self.method = request.method
+        self.path = request.path
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL)
+        self._started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.sampler.start()
+        self._start = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self._start
+        self.sampler.stop()
+        # Peak of all traced allocations in the process, concurrent requests included
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def save(self, status_code):
+        """Write the report files to PROFILE_DIR/<id>/."""
+        report_dir = profile_dir(self.id)
+        os.makedirs(report_dir, exist_ok=True)
+
+        self.profiler.dump_stats(os.path.join(report_dir, 'profile.prof'))
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats('cumulative').print_stats(50)
+        with open(os.path.join(report_dir, 'profile.txt'), 'w') as f:
+            f.write(text.getvalue())
+        with open(os.path.join(report_dir, 'stacks.collapsed'), 'w') as f:
+            f.write(self.sampler.collapsed())
+        with open(os.path.join(report_dir, 'summary.json'), 'w') as f:
+            json.dump({
+                'id': self.id,
+                'method': self.method,
+                'path': self.path,
+                'status_code': status_code,
+                'duration': round(self.duration, 3),
+                'peak_memory_bytes': self.peak_memory,
+                'samples': sum(self.sampler.counts.values()),
+                'created_at': timezone.now().isoformat(),
+            }, f, indent=2)
+        logger.debug(f"Saved profile {self.id} of {self.method} {self.path} ({self.duration:.2f} seconds)")
+
+def profile_dir(profile_id):
+    return os.path.join(settings.PROFILE_DIR, profile_id)
+
+def _wants_profile(request, user):
+    if not (user.is_authenticated and user.is_staff):
+        return False
+    return settings.PROFILE_ADMIN_REQUESTS or request.headers.get(PROFILE_HEADER) == '1'
+
+def _finish(profile, response):
+    profile.save(response.status_code)
+    response['X-Profile-Id'] = profile.id
+    return response
+
+async def _afinish(profile, response):
+    # Writing the report is blocking file I/O; keep it off the event loop
+    await asyncio.to_thread(profile.save, response.status_code)
+    response['X-Profile-Id'] = profile.id
+    return response
+
+def profile_request(view):
+    """
+    Decorator that profiles the view for admins who ask for it.
+
+    Works for sync and async views; apply it below @api_view and the other
+    decorators so it sees the view function itself.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if not _wants_profile(request, user) or not _profile_lock.acquire(blocking=False):
+                return await view(request, *args, **kwargs)
+            try:
+                profile = RequestProfile(request)
+                profile.start()
+                try:
+                    response = await view(request, *args, **kwargs)
+                finally:
+                    profile.stop()
+                return await _afinish(profile, response)
+            finally:
+                _profile_lock.release()
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _wants_profile(request, request.user) or not _profile_lock.acquire(blocking=False):
+            return view(request, *args, **kwargs)
+        try:
+            profile = RequestProfile(request)
+            profile.start()
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                profile.stop()
+            return _finish(profile, response)
+        finally:
+            _profile_lock.release()
+    return wrapper
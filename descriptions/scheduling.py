@@ -0,0 +1,113 @@
+"""
+Order in which workers claim queued jobs.
+
+Jobs are queued in a lane: 'interactive' for short clips someone is waiting
+on, 'bulk' for long videos and batches. When both lanes have work, claims
+are split between them by JOB_LANE_WEIGHTS using stride scheduling, so the
+interactive lane stays fast without starving bulk work.
+
+Within a lane, users take turns: the next job comes from the user with the
+fewest running jobs relative to their weight (JOB_USER_WEIGHTS, default 1),
+then the fewest recent claims relative to their weight, then the longest
+wait. One user's twenty uploads then share the workers with everyone
+else's instead of running ahead of them.
+
+JOB_INTERACTIVE_RESERVED workers of each pool only claim interactive
+jobs, so a burst of bulk work can never occupy every worker.
+
+Claim history is kept per worker process.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db.models import Count, Min, OuterRef, Q, Subquery
+
+from .models import ProcessingJob
+
+LANES = ('interactive', 'bulk')
+
+class FairScheduler:
+    """Weighted choice of lane and user for the next job to claim."""
+
+    def __init__(self, lane_weights, user_weights=None):
+        self.lane_weights = lane_weights
+        self.user_weights = user_weights or {}
+        self._passes = {lane: 0.0 for lane in lane_weights}
+        self._user_passes = {lane: {} for lane in lane_weights}
+        self._lock = threading.Lock()
+
+    def lane_order(self, lanes):
+        """
+        Order the lanes that have queued jobs, the one due a claim first.
+        Lanes that sat idle rejoin at the current pass instead of catching up.
+        """
+        with self._lock:
+            floor = min(self._passes[lane] for lane in lanes)
+            for lane in self._passes:
+                if lane not in lanes:
+                    self._passes[lane] = max(self._passes[lane], floor)
+            return sorted(lanes, key=lambda lane: (self._passes[lane], -self.lane_weights[lane]))
+
+    def charge(self, lane, user_id):
+        """Advance the lane's and the user's pass after a job was claimed."""
+        with self._lock:
+            self._passes[lane] += 1.0 / self.lane_weights[lane]
+            passes = self._user_passes[lane]
+            passes[user_id] = passes.get(user_id, 0.0) + 1.0 / self._user_weight(user_id)
+
+    def _user_weight(self, user_id):
+        return self.user_weights.get(user_id, 1)
+
+    def candidates(self, lane, limit=10):
+        """
+        IDs of the oldest queued job of each user in `lane`, the user due
+        a turn first.
+        """
+        # One grouped query: each user's running jobs and oldest queued job in the lane
+        queued = Q(status='queued', lane=lane)
+        oldest_job = (
+            ProcessingJob.objects.filter(queued, user_id=OuterRef('user_id'))
+            .order_by('created_at', 'id').values('id')[:1]
+        )
+        waiting = list(
+            ProcessingJob.objects.filter(Q(status='running') | queued).order_by().values('user_id')
+            .annotate(
+                running=Count('id', filter=Q(status='running')),
+                oldest=Min('created_at', filter=queued),
+                job_id=Subquery(oldest_job),
+            )
+            .filter(oldest__isnull=False)
+            .values_list('user_id', 'running', 'oldest', 'job_id')
+        )
+        with self._lock:
+            # Users who were not waiting join at the lowest pass instead of catching up
+            known = self._user_passes[lane]
+            floor = min((known[user[0]] for user in waiting if user[0] in known), default=0.0)
+            passes = self._user_passes[lane] = {user[0]: known.get(user[0], floor) for user in waiting}
+            users = sorted(waiting, key=lambda user: (
+                user[1] / self._user_weight(user[0]),
+                passes[user[0]],
+                user[2]
+            ))
+        return [job_id for _, _, _, job_id in users[:limit] if job_id is not None]
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return this process's fair scheduler, configured from settings."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(settings.JOB_LANE_WEIGHTS, settings.JOB_USER_WEIGHTS)
+        return _scheduler
+
+def choose_lane(source_type, upload_size=None, youtube_url=None):
+    """
+    Default lane for a job: uploads up to JOB_INTERACTIVE_MAX_UPLOAD_BYTES
+    and YouTube Shorts are interactive, everything else is bulk.
+    """
+    if source_type == 'video':
+        return 'interactive' if upload_size is not None and upload_size <= settings.JOB_INTERACTIVE_MAX_UPLOAD_BYTES else 'bulk'
+    return 'interactive' if youtube_url and '/shorts/' in youtube_url else 'bulk'
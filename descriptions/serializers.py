@@ -1,8 +1,17 @@
 from rest_framework import serializers
-from .models import AudioDescription
+from .models import AudioDescription, ProcessingJob
 
 class AudioDescriptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = AudioDescription
         fields = ['id', 'input_text', 'input_type', 'description_length', 'description_text', 'audio_url', 'created_at', 'user_id']
-        read_only_fields = ['created_at'] 
\ No newline at end of file
+        read_only_fields = ['created_at']
+
+class ProcessingJobSerializer(serializers.ModelSerializer):
+    description_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ProcessingJob
+        fields = ['id', 'job_type', 'status', 'lane', 'stage', 'progress', 'input_text', 'tts_provider', 'user_id', 'attempts',
+                  'timings', 'result', 'error', 'description_id', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,133 @@
+"""
+Coalescing of identical in-flight work.
+
+When a clip gets shared, many requests for the same video arrive at once.
+SingleFlight lets the first caller for a key do the work while the others
+wait and receive the same result (or the same exception). Coalescing is per
+worker process; across processes the description cache catches repeats
+once the first computation has finished.
+
+Async work runs as a task of its own on the first caller's event loop, so
+a caller that goes away (say, a client disconnecting) does not take the
+result from the others; the task is cancelled once no caller is left.
+"""
+
+import asyncio
+import threading
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.callers = 0  # Callers still waiting for the outcome
+        self.task = None  # Task running the work of an async call
+        self.futures = []  # (loop, future) of async callers waiting on this call
+
+    def finish(self):
+        self.done.set()
+        for loop, future in self.futures:
+            loop.call_soon_threadsafe(_resolve, future)
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time and share its outcome.
+
+    Threads use `do` and coroutines use `ado`; both kinds of caller can
+    share the same call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Call `fn()` unless a call for `key` is already running, in which case
+        wait for that one. Returns `(result, shared)` where `shared` tells
+        whether the result went to more than one caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+            call.callers += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, call.waiters > 0
+
+    async def ado(self, key, fn):
+        """
+        Async `do`: await `fn()` unless a call for `key` is already running,
+        in which case wait for that one without blocking the event loop.
+        Cancelling a caller leaves the call running for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                call.task = loop.create_task(self._arun(key, call, fn))
+            else:
+                call.waiters += 1
+            call.callers += 1
+            waiter = loop.create_future()
+            call.futures.append((loop, waiter))
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            self._leave(key, call)
+            raise
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader or call.waiters > 0
+
+    async def _arun(self, key, call, fn):
+        try:
+            call.result = await fn()
+        except asyncio.CancelledError:
+            call.error = RuntimeError(f"Shared call for {key} was cancelled")
+            raise
+        except Exception as e:
+            call.error = e  # Raised to the callers, not by the task
+        finally:
+            self._finish(key, call)
+
+    def _leave(self, key, call):
+        """An async caller was cancelled; cancel the work if it was the last one waiting."""
+        with self._lock:
+            call.callers -= 1
+            if call.callers or call.task is None or call.done.is_set():
+                return
+            # New callers start afresh instead of joining the call being cancelled
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.task.get_loop().call_soon_threadsafe(call.task.cancel)
+
+    def _finish(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.finish()
@@ -1,3 +1,1115 @@
-from django.test import TestCase
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from description_cache import DescriptionCache
+from media_cache import MediaCache
+from metrics import StageMetrics
+from outbound import OutboundScheduler, ProviderLimiter
+from text_to_speech_hume import HumeTTS
+from video_processing import GrowingFilePipe, KeyframeSelector, VideoProcessor, _read_frames, get_gemini_loop
+
+from . import pipeline
+from .admission import StageLimiter, StageOverloaded
+from .apps import SERVES_REQUESTS_ENV, serves_requests
+from .jobs import JobWorkerPool, claim_next_job, recover_jobs, run_job
+from .models import ProcessingJob
+from .profiling import RequestProfile, profile_request
+from .scheduling import FairScheduler
+from .singleflight import SingleFlight
+
+
+def wait_until(condition, timeout=5):
+    """Poll `condition` until it holds; fail the test after `timeout` seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def waiters(self, flight, key):
+        call = flight._calls.get(key)
+        return call.waiters if call else 0
+
+    def test_waiters_share_the_result(self):
+        flight = SingleFlight()
+        results = []
+
+        def wait():
+            results.append(flight.do('key', lambda: 'other'))
+
+        waiter = threading.Thread(target=wait)
+
+        def work():
+            waiter.start()
+            wait_until(lambda: self.waiters(flight, 'key'))
+            return 'result'
+
+        self.assertEqual(flight.do('key', work), ('result', True))
+        waiter.join()
+        self.assertEqual(results, [('result', True)])
+        self.assertEqual(flight.do('key', lambda: 'again'), ('again', False))
+
+    def test_leader_error_is_raised_to_waiters(self):
+        flight = SingleFlight()
+        error = ValueError("download failed")
+        errors = []
+
+        def wait():
+            try:
+                flight.do('key', lambda: 'other')
+            except ValueError as e:
+                errors.append(e)
+
+        waiter = threading.Thread(target=wait)
+
+        def work():
+            waiter.start()
+            wait_until(lambda: self.waiters(flight, 'key'))
+            raise error
+
+        with self.assertRaises(ValueError):
+            flight.do('key', work)
+        waiter.join()
+        self.assertEqual(errors, [error])
+        self.assertEqual(flight._calls, {})
+
+    def test_cancelled_async_leader_leaves_result_to_waiters(self):
+        flight = SingleFlight()
+
+        async def main():
+            release = asyncio.Event()
+
+            async def work():
+                await release.wait()
+                return 'result'
+
+            leader = asyncio.create_task(flight.ado('key', work))
+            waiter = asyncio.create_task(flight.ado('key', work))
+            while not self.waiters(flight, 'key'):
+                await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            release.set()
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), ('result', True))
+        self.assertEqual(flight._calls, {})
+
+    def test_work_cancelled_when_every_caller_is(self):
+        flight = SingleFlight()
+
+        async def main():
+            started = asyncio.Event()
+            cancelled = asyncio.Event()
+
+            async def work():
+                started.set()
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+
+            callers = [asyncio.create_task(flight.ado('key', work)) for _ in range(2)]
+            await started.wait()
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.wait_for(cancelled.wait(), 5)
+            self.assertEqual(flight._calls, {})
+
+            async def again():
+                return 'again'
+
+            return await flight.ado('key', again)
+
+        self.assertEqual(asyncio.run(main()), ('again', False))
+
+    def test_async_waiter_shares_thread_leader(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def work():
+            release.wait(5)
+            return 'result'
+
+        leader = threading.Thread(target=flight.do, args=('key', work))
+        leader.start()
+        wait_until(lambda: 'key' in flight._calls)
+
+        async def main():
+            waiter = asyncio.create_task(flight.ado('key', work))
+            while not self.waiters(flight, 'key'):
+                await asyncio.sleep(0.01)
+            release.set()
+            return await waiter
+
+        self.assertEqual(asyncio.run(main()), ('result', True))
+        leader.join()
+
+
+class StageLimiterTests(SimpleTestCase):
+    def make_limiter(self, concurrency=1, queue_size=2, wait_timeout=5):
+        return StageLimiter('test', concurrency, queue_size, wait_timeout)
+
+    def test_full_queue_is_rejected(self):
+        limiter = self.make_limiter(queue_size=0)
+        limiter.acquire()
+        with self.assertRaises(StageOverloaded):
+            limiter.acquire()
+        limiter.release(0.1)
+        self.assertEqual(limiter.active, 0)
+
+    def test_wait_timeout_is_rejected(self):
+        limiter = self.make_limiter(wait_timeout=0.05)
+        limiter.acquire()
+        with self.assertRaises(StageOverloaded):
+            limiter.acquire()
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_slot_releases_on_error(self):
+        limiter = self.make_limiter()
+        with self.assertRaises(ValueError):
+            with limiter.slot():
+                raise ValueError("boom")
+        self.assertEqual(limiter.active, 0)
+        self.assertTrue(limiter.try_acquire())
+
+    def test_waiter_gets_released_slot(self):
+        limiter = self.make_limiter()
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def wait():
+            with limiter.slot():
+                acquired.set()
+
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        wait_until(lambda: limiter.waiting)
+        self.assertFalse(limiter.try_acquire())  # Queued callers go first
+        limiter.release(0.1)
+        waiter.join(5)
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(limiter.active, 0)
+
+    def test_aslot_releases_on_error(self):
+        limiter = self.make_limiter()
+
+        async def fail():
+            async with limiter.aslot():
+                raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(fail())
+        self.assertEqual(limiter.active, 0)
+
+    def test_cancelled_aslot_hands_back_late_grant(self):
+        limiter = self.make_limiter()
+        limiter.acquire()
+        entered = threading.Event()
+
+        async def main():
+            async def use_slot():
+                async with limiter.aslot():
+                    entered.set()
+
+            task = asyncio.create_task(use_slot())
+            while not limiter.waiting:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The cancelled caller left the queue, so the slot is simply freed
+            limiter.release(0.1)
+            await asyncio.to_thread(wait_until, lambda: not limiter.waiting and not limiter.active)
+
+        asyncio.run(main())
+        self.assertFalse(entered.is_set())
+        self.assertEqual(limiter.active, 0)
+        self.assertEqual(limiter.waiting, 0)
+
+    def test_aslot_wait_timeout_is_rejected(self):
+        limiter = self.make_limiter(wait_timeout=0.05)
+        limiter.acquire()
+
+        async def wait():
+            async with limiter.aslot():
+                pass
+
+        with self.assertRaises(StageOverloaded):
+            asyncio.run(wait())
+        self.assertEqual(limiter.waiting, 0)
+        limiter.release(0.1)
+        self.assertEqual(limiter.active, 0)
+
+    def test_queued_async_callers_hold_no_threads(self):
+        limiter = self.make_limiter(queue_size=4)
+        limiter.acquire()
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+
+            async def use_slot():
+                async with limiter.aslot():
+                    return True
+
+            waiters = [asyncio.create_task(use_slot()) for _ in range(3)]
+            while limiter.waiting < 3:
+                await asyncio.sleep(0.01)
+            # The executor's only thread is still free for real work
+            self.assertEqual(await asyncio.wait_for(asyncio.to_thread(lambda: 'done'), 2), 'done')
+            limiter.release(0.1)
+            return await asyncio.gather(*waiters)
+
+        self.assertEqual(asyncio.run(main()), [True] * 3)
+        self.assertEqual(limiter.active, 0)
+
+
+class ProviderLimiterTests(SimpleTestCase):
+    def test_tokens_refill_at_rate(self):
+        limiter = ProviderLimiter('test', rate=20, burst=2, concurrency=10)
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+        # The burst starts two calls at once; the third waits for a token
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        self.assertEqual(limiter.active, 3)
+
+    def test_concurrency_cap(self):
+        limiter = ProviderLimiter('test', rate=1000, burst=10, concurrency=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        waiter.start()
+        wait_until(lambda: limiter.waiting)
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release()
+        waiter.join(5)
+        self.assertTrue(acquired.is_set())
+        self.assertEqual(limiter.active, 1)
+
+    def test_earliest_deadline_served_first(self):
+        limiter = ProviderLimiter('test', rate=1000, burst=10, concurrency=1)
+        limiter.acquire()
+        order = []
+
+        async def main():
+            async def call(deadline):
+                await limiter.aacquire(deadline)
+                order.append(deadline)
+                limiter.release()
+
+            tasks = [asyncio.create_task(call(deadline)) for deadline in (30.0, 10.0, 20.0, 10.0)]
+            while limiter.waiting < 4:
+                await asyncio.sleep(0.01)
+            limiter.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        self.assertEqual(order, [10.0, 10.0, 20.0, 30.0])
+        self.assertEqual(limiter.active, 0)
+
+    def test_cancelled_acall_frees_its_place(self):
+        scheduler = OutboundScheduler({'test': {'rate': 1000, 'burst': 10, 'concurrency': 1}})
+        limiter = scheduler.limiters['test']
+        limiter.acquire()
+
+        async def main():
+            async def use_slot():
+                async with scheduler.acall('test'):
+                    pass
+
+            task = asyncio.create_task(use_slot())
+            while not limiter.waiting:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        self.assertEqual(limiter.waiting, 0)
+        limiter.release()
+        self.assertEqual(limiter.active, 0)
+
+    def test_queued_acalls_hold_no_threads(self):
+        scheduler = OutboundScheduler({'test': {'rate': 1000, 'burst': 10, 'concurrency': 1}})
+        limiter = scheduler.limiters['test']
+        limiter.acquire()
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+
+            async def use_slot():
+                async with scheduler.acall('test'):
+                    return True
+
+            waiters = [asyncio.create_task(use_slot()) for _ in range(3)]
+            while limiter.waiting < 3:
+                await asyncio.sleep(0.01)
+            self.assertEqual(await asyncio.wait_for(asyncio.to_thread(lambda: 'done'), 2), 'done')
+            limiter.release()
+            return await asyncio.gather(*waiters)
+
+        self.assertEqual(asyncio.run(main()), [True] * 3)
+        self.assertEqual(limiter.active, 0)
+
+
+class ServesRequestsTests(SimpleTestCase):
+    def check(self, argv, **environ):
+        with mock.patch('sys.argv', argv), mock.patch.dict(os.environ, environ):
+            for name in ('RUN_MAIN', SERVES_REQUESTS_ENV):
+                if name not in environ:
+                    os.environ.pop(name, None)
+            return serves_requests()
+
+    def test_servers_start_workers(self):
+        self.assertTrue(self.check(['/venv/bin/gunicorn', 'blindtube.wsgi'], **{SERVES_REQUESTS_ENV: '1'}))
+        self.assertTrue(self.check(['/venv/bin/uvicorn', 'blindtube.asgi:application'], **{SERVES_REQUESTS_ENV: '1'}))
+        self.assertTrue(self.check(['manage.py', 'runserver'], RUN_MAIN='true'))
+        self.assertTrue(self.check(['manage.py', 'runserver', '--noreload']))
+        self.assertTrue(self.check(['/usr/lib/python3/django/__main__.py', 'runserver'], RUN_MAIN='true'))
+
+    def test_other_processes_do_not(self):
+        self.assertFalse(self.check(['manage.py', 'runserver']))
+        self.assertFalse(self.check(['manage.py', 'migrate']))
+        self.assertFalse(self.check(['manage.py', 'run_job_workers']))
+        self.assertFalse(self.check(['/usr/lib/python3/django/__main__.py', 'migrate']))
+        self.assertFalse(self.check(['/venv/bin/pytest', '-q']))
+        self.assertFalse(self.check(['/venv/bin/celery', '-A', 'blindtube', 'worker']))
+        self.assertFalse(self.check(['report.py']))
+        self.assertFalse(self.check(['']))
+
+
+class DescriptionCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.cache = DescriptionCache(self.cache_dir, max_bytes=10 * 1024 * 1024)
+
+    def test_put_and_get(self):
+        self.cache.put('key', 'A cat.', [b'frame'], {'title': 'Cats'})
+        entry = self.cache.get('key')
+        self.assertEqual(entry['description_text'], 'A cat.')
+        self.assertEqual(entry['metadata'], {'title': 'Cats'})
+        self.assertIsNone(self.cache.get('other'))
+
+    def test_directory_created_on_first_put(self):
+        cache_dir = os.path.join(self.cache_dir, 'descriptions')
+        cache = DescriptionCache(cache_dir)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.evict(), 0)
+        self.assertFalse(os.path.exists(cache_dir))
+        cache.put('key', 'A cat.', [b'frame'])
+        self.assertEqual(cache.get('key')['description_text'], 'A cat.')
+
+    def test_second_put_of_same_key_keeps_existing_entry(self):
+        self.cache.put('key', 'First.', [b'frame'])
+        self.cache.put('key', 'Second.', [b'frame'])
+        self.assertEqual(self.cache.get('key')['description_text'], 'First.')
+        self.assertEqual([p for p in os.listdir(self.cache_dir) if p.startswith('.')], [])
+
+    def test_concurrent_puts_of_same_key(self):
+        errors = []
+        barrier = threading.Barrier(4)
+
+        def put(i):
+            barrier.wait()
+            try:
+                self.cache.put('key', f'Text {i}.', [b'frame'] * 20)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=put, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertIsNotNone(self.cache.get('key'))
+
+    def test_broken_entry_is_replaced(self):
+        os.makedirs(os.path.join(self.cache_dir, 'key'))
+        with open(os.path.join(self.cache_dir, 'key', '00000.jpg'), 'wb') as f:
+            f.write(b'partial')
+        self.cache.put('key', 'A cat.', [b'frame'])
+        self.assertEqual(self.cache.get('key')['description_text'], 'A cat.')
+
+    def test_eviction_drops_least_recently_used(self):
+        self.cache.max_bytes = 2500
+        self.cache.put('old', 'Old.', [b'x' * 1000])
+        time.sleep(0.01)
+        self.cache.put('new', 'New.', [b'x' * 1000])
+        time.sleep(0.01)
+        self.cache.get('old')
+        self.cache.put('newest', 'Newest.', [b'x' * 1000])
+        self.assertIsNotNone(self.cache.get('old'))
+        self.assertIsNone(self.cache.get('new'))
+
+
+class MediaCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.cache = MediaCache(self.cache_dir, max_bytes=10 * 1024 * 1024)
+
+    def download(self, data=b'video'):
+        temp_dir = self.cache.reserve()
+        with open(os.path.join(temp_dir, 'video.mp4'), 'wb') as f:
+            f.write(data)
+        return temp_dir
+
+    def test_commit_and_find(self):
+        path = self.cache.commit(self.download(), 'abc', '18', 'video.mp4', {'title': 'Cats'})
+        hit = self.cache.find('abc')
+        self.assertEqual(hit['path'], path)
+        self.assertEqual(hit['metadata'], {'title': 'Cats'})
+        self.assertIsNone(self.cache.find('abc', {'title': 'Dogs'}))
+        self.assertIsNone(self.cache.find('ab'))
+
+    def test_directory_created_on_first_reserve(self):
+        cache_dir = os.path.join(self.cache_dir, 'youtube')
+        cache = MediaCache(cache_dir)
+        self.assertIsNone(cache.find('abc'))
+        self.assertEqual(cache.remove(), 0)
+        self.assertFalse(os.path.exists(cache_dir))
+        self.assertTrue(os.path.isdir(cache.reserve()))
+
+    def test_second_commit_of_same_format_keeps_existing_entry(self):
+        first = self.download(b'first')
+        second = self.download(b'second')
+        path = self.cache.commit(first, 'abc', '18', 'video.mp4')
+        self.assertEqual(self.cache.commit(second, 'abc', '18', 'video.mp4'), path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'first')
+        self.assertFalse(os.path.exists(second))
+
+    def test_eviction_keeps_entry_just_added(self):
+        self.cache.max_bytes = 1500
+        self.cache.commit(self.download(b'x' * 1000), 'old', '18', 'video.mp4')
+        time.sleep(0.01)
+        self.cache.commit(self.download(b'x' * 2000), 'big', '18', 'video.mp4')
+        self.assertIsNone(self.cache.find('old'))
+        self.assertIsNotNone(self.cache.find('big'))
+
+
+@override_settings(DESCRIPTION_CACHE_ENABLED=True)
+class StoreDescriptionTests(SimpleTestCase):
+    def test_cache_write_failure_still_returns_description(self):
+        processor = mock.Mock(payload_size=mock.Mock(return_value=5))
+        with mock.patch.object(pipeline.description_cache, 'put', side_effect=OSError("disk full")), \
+                self.assertLogs('descriptions.pipeline', 'WARNING'):
+            result = pipeline.store_description(processor, [{'data': b'frame'}], 'A cat.', 'key')
+        self.assertEqual(result['description_text'], 'A cat.')
+        self.assertFalse(result['cached'])
+
+
+class DescribeVideoFlightTests(SimpleTestCase):
+    def test_job_does_not_join_view_call(self):
+        job_done = threading.Event()
+        view_errors = []
+
+        def describe(video_path, cache_key, metadata, on_stage, blocking, resume, on_checkpoint):
+            if not blocking:
+                job_done.wait(5)
+                raise StageOverloaded('gemini', 1)
+            return {'description_text': 'A cat.', 'frames_processed': 1, 'payload_bytes': 5, 'cached': False}
+
+        def view():
+            try:
+                pipeline.describe_video('clip.mp4', 'key', blocking=False)
+            except StageOverloaded as e:
+                view_errors.append(e)
+
+        with mock.patch.object(pipeline, '_describe_video', describe):
+            thread = threading.Thread(target=view)
+            thread.start()
+            wait_until(lambda: ('key', False) in pipeline.description_flights._calls)
+            result = pipeline.describe_video('clip.mp4', 'key')
+            job_done.set()
+            thread.join()
+        self.assertEqual((result['description_text'], result['shared']), ('A cat.', False))
+        self.assertEqual(len(view_errors), 1)
+
+
+class YouTubeDownloadFlightTests(SimpleTestCase):
+    def test_frames_join_running_download(self):
+        url = 'https://youtu.be/abcdefghijk'
+        release = threading.Event()
+        downloads = []
+        parts = [{'mime_type': 'image/jpeg', 'data': b'frame'}]
+
+        def download(youtube_url, progress_hook=None):
+            downloads.append(youtube_url)
+            release.wait(5)
+            return '/videos/cats.mp4', 'Cats'
+
+        results = []
+        with mock.patch.object(pipeline, 'download_youtube_video', download), \
+                mock.patch.object(pipeline, 'cached_youtube_video', return_value=None), \
+                mock.patch.object(pipeline, 'get_video_processor'), \
+                mock.patch.object(pipeline, 'build_frame_parts', return_value=parts) as build_frame_parts:
+            thread = threading.Thread(target=lambda: results.append(pipeline.fetch_youtube_video(url)))
+            thread.start()
+            wait_until(lambda: downloads)
+            frames = threading.Thread(target=lambda: results.append(pipeline.fetch_youtube_frames(url)))
+            frames.start()
+            wait_until(lambda: pipeline.download_flights._calls['abcdefghijk'].waiters)
+            release.set()
+            thread.join()
+            frames.join()
+        self.assertEqual(len(downloads), 1)
+        self.assertIn(('/videos/cats.mp4', 'Cats'), results)
+        self.assertIn(('/videos/cats.mp4', 'Cats', parts), results)
+        # The joining caller saw no progress, so it decoded the finished file
+        build_frame_parts.assert_called_once_with(mock.ANY, '/videos/cats.mp4')
+
+
+class SelectVideoFormatTests(SimpleTestCase):
+    def fmt(self, format_id, height, vcodec='avc1', acodec='none', filesize=1000):
+        return {'format_id': format_id, 'height': height, 'vcodec': vcodec, 'acodec': acodec, 'filesize': filesize}
+
+    def select(self, *formats, target_height=360):
+        return pipeline.select_video_format(list(formats), target_height)['format_id']
+
+    def test_smallest_height_at_or_above_target(self):
+        self.assertEqual(self.select(self.fmt('240', 240), self.fmt('480', 480), self.fmt('720', 720)), '480')
+        self.assertEqual(self.select(self.fmt('360', 360), self.fmt('480', 480)), '360')
+
+    def test_tallest_when_none_reaches_target(self):
+        self.assertEqual(self.select(self.fmt('144', 144), self.fmt('240', 240)), '240')
+
+    def test_video_only_preferred_over_muxed(self):
+        muxed = self.fmt('18', 360, acodec='mp4a', filesize=500)
+        self.assertEqual(self.select(muxed, self.fmt('134', 360, filesize=900)), '134')
+
+    def test_av1_ranked_last(self):
+        av1 = self.fmt('395', 360, vcodec='av01.0.04M.08', filesize=100)
+        muxed = self.fmt('18', 360, acodec='mp4a', filesize=500)
+        self.assertEqual(self.select(av1, muxed), '18')
+        self.assertEqual(self.select(av1), '395')
+
+    def test_smallest_file_wins(self):
+        self.assertEqual(self.select(self.fmt('a', 360, filesize=900), self.fmt('b', 360, filesize=300)), 'b')
+
+    def test_audio_only_and_unsized_formats(self):
+        audio = self.fmt('140', None, vcodec='none', acodec='mp4a')
+        self.assertIsNone(pipeline.select_video_format([audio], 360))
+        self.assertEqual(self.select(audio, {'format_id': 'direct'}), 'direct')
+
+
+class IterParagraphsTests(SimpleTestCase):
+    def test_paragraphs_split_across_chunk_boundaries(self):
+        chunks = ['\n\nFirst para', 'graph.\n', '\nSecond', '.\n \n', '\nThird.', '']
+        self.assertEqual(list(pipeline.iter_paragraphs(chunks)), ['First paragraph.', 'Second.', 'Third.'])
+
+    def test_each_paragraph_yielded_once_complete(self):
+        seen = []
+
+        def chunks():
+            for chunk in ['One.\n\nTw', 'o.\n\n', 'Three.']:
+                seen.append(chunk)
+                yield chunk
+
+        paragraphs = pipeline.iter_paragraphs(chunks())
+        self.assertEqual(next(paragraphs), 'One.')
+        self.assertEqual(len(seen), 1)  # Not held back until the stream ends
+        self.assertEqual(list(paragraphs), ['Two.', 'Three.'])
+
+
+class PayloadBudgetTests(SimpleTestCase):
+    def parts(self, *sizes):
+        return [{'mime_type': 'image/jpeg', 'data': b'x' * size} for size in sizes]
+
+    def test_frames_are_thinned_to_fit(self):
+        processor = VideoProcessor(api_key='test', payload_budget=250)
+        kept = processor.build_image_parts(part['data'] for part in self.parts(100, 100, 100, 100))
+        self.assertEqual(len(kept), 2)
+
+    def test_smallest_frame_kept_when_none_fits(self):
+        processor = VideoProcessor(api_key='test', payload_budget=50)
+        kept = processor.build_image_parts(part['data'] for part in self.parts(300, 100, 200))
+        self.assertEqual([len(part['data']) for part in kept], [100])
+
+
+def encode_gray(value, size=(48, 64)):
+    """JPEG of a solid gray frame."""
+    return cv2.imencode('.jpg', np.full(size, value, np.uint8))[1].tobytes()
+
+
+def gray_level(frame):
+    """Mean brightness of a JPEG frame."""
+    return cv2.imdecode(np.frombuffer(frame, np.uint8), cv2.IMREAD_GRAYSCALE).mean()
+
+
+class FrameSamplingTests(SimpleTestCase):
+    def indices(self, fps, total_frames, frames_per_minute=None, max_frames=None, frame_interval=5):
+        step = VideoProcessor._sampling_step(fps, total_frames, frame_interval, frames_per_minute, max_frames)
+        return list(VideoProcessor._sample_indices(total_frames, step, max_frames))
+
+    def test_spacing_follows_frames_per_minute(self):
+        # 100 seconds at 30 fps, 6 frames a minute: one frame every 10 seconds
+        self.assertEqual(self.indices(30, 3000, frames_per_minute=6), list(range(0, 3000, 300)))
+
+    def test_max_frames_spreads_samples_over_whole_video(self):
+        self.assertEqual(self.indices(30, 3000, frames_per_minute=6, max_frames=4), [0, 750, 1500, 2250])
+
+    def test_unknown_frame_count_stops_at_max_frames(self):
+        self.assertEqual(self.indices(0, 0, max_frames=3), [0, 5, 10])
+
+    def test_grab_and_seek_read_the_same_frames(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        video_path = os.path.join(tmp, 'clip.avi')
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for i in range(250):
+            writer.write(np.full((48, 64, 3), i, np.uint8))
+        writer.release()
+        indices = [0, 3, 100, 101, 240]
+
+        def read(seek_threshold):
+            video = cv2.VideoCapture(video_path)
+            try:
+                with mock.patch.object(VideoProcessor, 'SEEK_THRESHOLD', seek_threshold):
+                    return [gray_level(frame) for frame in _read_frames(video, indices, None, 95)]
+            finally:
+                video.release()
+
+        grabbed, sought = read(seek_threshold=10000), read(seek_threshold=0)
+        self.assertEqual(len(grabbed), len(indices))
+        for index, a, b in zip(indices, grabbed, sought):
+            self.assertAlmostEqual(a, index, delta=2)
+            self.assertAlmostEqual(b, index, delta=2)
+
+
+class KeyframeSelectorTests(SimpleTestCase):
+    def test_static_frames_collapse(self):
+        frames = [encode_gray(100)] * 5 + [encode_gray(200)] * 3 + [encode_gray(101)]
+        selected = KeyframeSelector(threshold=0.03).select(frames)
+        self.assertEqual([round(gray_level(frame)) for frame in selected], [100, 200, 101])
+
+    def test_cap_thins_evenly(self):
+        frames = [encode_gray(i * 25) for i in range(10)]
+        selected = KeyframeSelector(threshold=0.03, max_frames=4).select(frames)
+        self.assertEqual(selected, [frames[0], frames[3], frames[6], frames[9]])
+
+
+class DecodePoolTests(SimpleTestCase):
+    def test_pool_is_reused_until_closed(self):
+        processor = VideoProcessor(api_key='test')
+        pool = processor._decode_pool(2)
+        self.assertIs(processor._decode_pool(2), pool)
+        self.assertIs(processor._decode_pool(1), pool)
+        larger = processor._decode_pool(4)
+        self.assertIsNot(larger, pool)
+        processor.close()
+        self.assertIsNot(processor._decode_pool(4), larger)
+        processor.close()
+
+
+class SplitWindowsTests(SimpleTestCase):
+    def sizes(self, frames, window_size=60):
+        return [len(window) for window in VideoProcessor.split_windows(list(range(frames)), window_size)]
+
+    def test_small_last_window_is_folded_into_previous(self):
+        self.assertEqual(self.sizes(61), [61])
+        self.assertEqual(self.sizes(140), [60, 80])
+
+    def test_large_last_window_is_kept(self):
+        self.assertEqual(self.sizes(90), [60, 30])
+        self.assertEqual(self.sizes(120), [60, 60])
+        self.assertEqual(self.sizes(10), [10])
+
+    def test_one_request_just_over_a_window(self):
+        processor = VideoProcessor(api_key='test')
+        with mock.patch.object(processor, '_generate', return_value='A cat.') as generate:
+            processor.generate_description_segmented(list(range(61)), window_size=60)
+        self.assertEqual(generate.call_count, 1)
+
+
+class AsyncGenerationTests(SimpleTestCase):
+    def test_requests_from_any_loop_run_on_gemini_loop(self):
+        processor = VideoProcessor(api_key='test')
+        loops = []
+
+        async def generate_content_async(**kwargs):
+            loops.append(asyncio.get_running_loop())
+            return mock.Mock(text='A cat.')
+
+        with mock.patch.object(processor.model, 'generate_content_async', side_effect=generate_content_async):
+            self.assertEqual(asyncio.run(processor.generate_description_async([b'frame'])), 'A cat.')
+            self.assertEqual(asyncio.run(processor.generate_description_async([b'frame'])), 'A cat.')
+        self.assertEqual(loops, [get_gemini_loop()] * 2)
+
+    def test_cancelling_caller_cancels_request(self):
+        processor = VideoProcessor(api_key='test')
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        async def generate_content_async(**kwargs):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def main():
+            task = asyncio.create_task(processor.generate_description_async([b'frame']))
+            await asyncio.to_thread(started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch.object(processor.model, 'generate_content_async', side_effect=generate_content_async):
+            asyncio.run(main())
+        self.assertTrue(cancelled.wait(5))
+
+
+class StreamDescriptionTests(SimpleTestCase):
+    def chunks(self, *texts):
+        return [mock.Mock(parts=[text], text=text) for text in texts]
+
+    def test_slot_is_released_before_slow_reader_finishes(self):
+        processor = VideoProcessor(api_key='test')
+        limiter = StageLimiter('test', 1, 0, 5)
+        with mock.patch.object(processor, '_request', return_value=iter(self.chunks('A ', 'cat.'))):
+            stream = processor.stream_description([b'frame'], slot=limiter.slot())
+            self.assertEqual(next(stream), 'A ')
+            wait_until(lambda: not limiter.active)
+            self.assertEqual(list(stream), ['cat.'])
+
+    def test_closing_stream_stops_generation(self):
+        processor = VideoProcessor(api_key='test')
+        limiter = StageLimiter('test', 1, 0, 5)
+        released = threading.Event()
+
+        def request(contents, stream=False):
+            try:
+                while True:
+                    yield self.chunks('more ')[0]
+            finally:
+                released.set()
+
+        with mock.patch.object(processor, '_request', side_effect=request):
+            stream = processor.stream_description([b'frame'], slot=limiter.slot())
+            next(stream)
+            stream.close()
+        self.assertTrue(released.is_set())
+        self.assertEqual(limiter.active, 0)
+
+    def test_errors_reach_the_reader(self):
+        processor = VideoProcessor(api_key='test')
+        with mock.patch.object(processor, '_request', side_effect=RuntimeError("quota")):
+            with self.assertRaises(RuntimeError):
+                list(processor.stream_description([b'frame']))
+
+
+class FairSchedulingTests(TestCase):
+    def make_job(self, user_id, lane='bulk', status='queued'):
+        return ProcessingJob.objects.create(job_type='video', input_text='clip.mp4', user_id=user_id, lane=lane, status=status)
+
+    def test_candidates_take_oldest_job_of_least_busy_user_first(self):
+        busy_first = self.make_job('busy')
+        self.make_job('busy')
+        self.make_job('busy', status='running')
+        idle_first = self.make_job('idle')
+        self.make_job('idle')
+        self.make_job('other', lane='interactive')
+        scheduler = FairScheduler({'interactive': 4, 'bulk': 1})
+        with self.assertNumQueries(1):
+            job_ids = scheduler.candidates('bulk')
+        self.assertEqual(job_ids, [idle_first.id, busy_first.id])
+
+    @mock.patch('descriptions.jobs.get_scheduler', lambda: FairScheduler({'interactive': 4, 'bulk': 1}))
+    def test_claim_limited_to_lanes(self):
+        bulk = self.make_job('a')
+        self.assertIsNone(claim_next_job(('interactive',)))
+        interactive = self.make_job('b', lane='interactive')
+        self.assertEqual(claim_next_job(('interactive',)).id, interactive.id)
+        job = claim_next_job()
+        self.assertEqual(job.id, bulk.id)
+        self.assertEqual((job.status, job.attempts), ('running', 1))
+
+    def test_reserved_workers_leave_one_for_any_lane(self):
+        self.assertEqual(JobWorkerPool(2, interactive_reserved=1).interactive_reserved, 1)
+        self.assertEqual(JobWorkerPool(1, interactive_reserved=1).interactive_reserved, 0)
+        self.assertEqual(JobWorkerPool(3, interactive_reserved=5).interactive_reserved, 2)
+
+
+class StageMetricsTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = StageMetrics(buckets=(0.1, 1))
+        for seconds in (0.05, 1, 3):
+            metrics.observe('decode', seconds)
+        lines = metrics.render().splitlines()
+        self.assertEqual([line for line in lines if line.startswith('blindtube_stage_duration_seconds')], [
+            'blindtube_stage_duration_seconds_bucket{stage="decode",le="0.1"} 1',
+            'blindtube_stage_duration_seconds_bucket{stage="decode",le="1"} 2',  # Upper bounds are inclusive
+            'blindtube_stage_duration_seconds_bucket{stage="decode",le="+Inf"} 3',
+            'blindtube_stage_duration_seconds_sum{stage="decode"} 4.05',
+            'blindtube_stage_duration_seconds_count{stage="decode"} 3',
+        ])
+
+    def test_track_counts_outcomes_and_in_flight(self):
+        metrics = StageMetrics()
+        with metrics.track('gemini'):
+            self.assertIn('blindtube_stage_in_flight{stage="gemini"} 1', metrics.render())
+        with self.assertRaises(ValueError):
+            with metrics.track('gemini'):
+                raise ValueError("boom")
+        text = metrics.render()
+        self.assertIn('blindtube_stage_calls_total{stage="gemini",outcome="ok"} 1', text)
+        self.assertIn('blindtube_stage_calls_total{stage="gemini",outcome="error"} 1', text)
+        self.assertIn('blindtube_stage_in_flight{stage="gemini"} 0', text)
+        self.assertIn('blindtube_stage_duration_seconds_count{stage="gemini"} 2', text)
+
+
+class ProfileRequestTests(SimpleTestCase):
+    def test_async_report_is_written_off_the_event_loop(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir, ignore_errors=True)
+        save_threads = []
+        original_save = RequestProfile.save
+
+        def save(profile, status_code):
+            save_threads.append(threading.get_ident())
+            original_save(profile, status_code)
+
+        @profile_request
+        async def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/', HTTP_X_PROFILE='1')
+        request.auser = mock.AsyncMock(return_value=mock.Mock(is_authenticated=True, is_staff=True))
+        with override_settings(PROFILE_DIR=profile_dir), mock.patch.object(RequestProfile, 'save', save):
+            response = asyncio.run(view(request))
+        self.assertNotEqual(save_threads, [threading.get_ident()])
+        self.assertTrue(os.path.exists(os.path.join(profile_dir, response['X-Profile-Id'], 'summary.json')))
+
+
+class WorkerKilled(BaseException):
+    """Stands in for a worker process dying in the middle of a job."""
+
+
+@override_settings(DESCRIPTION_CACHE_ENABLED=False, JOB_STALE_SECONDS=60, JOB_MAX_ATTEMPTS=3)
+@mock.patch('descriptions.jobs.get_scheduler', lambda: FairScheduler({'interactive': 4, 'bulk': 1}))
+class JobRecoveryTests(TestCase):
+    def setUp(self):
+        checkpoint_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkpoint_dir, ignore_errors=True)
+        self.enterContext(override_settings(JOB_CHECKPOINT_DIR=checkpoint_dir))
+
+    def make_job(self, **fields):
+        return ProcessingJob.objects.create(job_type='video', input_text='clip.mp4', user_id='u', **fields)
+
+    def stale(self, job):
+        ProcessingJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+
+    def test_stale_jobs_are_requeued_until_out_of_attempts(self):
+        now = timezone.now()
+        retry = self.make_job(status='running', attempts=1, started_at=now)
+        exhausted = self.make_job(status='running', attempts=3, started_at=now)
+        alive = self.make_job(status='running', attempts=1, started_at=now, heartbeat_at=now)
+        self.stale(retry)
+        self.stale(exhausted)
+        self.assertEqual(recover_jobs(), 1)
+        self.assertEqual(ProcessingJob.objects.get(id=retry.id).status, 'queued')
+        self.assertEqual(ProcessingJob.objects.get(id=exhausted.id).status, 'failed')
+        self.assertEqual(ProcessingJob.objects.get(id=alive.id).status, 'running')
+
+    def test_interrupted_job_resumes_from_frame_checkpoint(self):
+        processor = VideoProcessor(api_key='test')
+        frames = [{'mime_type': 'image/jpeg', 'data': b'frame %d' % i} for i in range(3)]
+        build_frame_parts = mock.Mock(return_value=frames)
+        generate = mock.Mock(side_effect=[WorkerKilled(), 'A cat.'])
+        self.make_job()
+
+        with mock.patch('descriptions.pipeline.get_video_processor', return_value=processor), \
+                mock.patch('descriptions.pipeline.build_frame_parts', build_frame_parts), \
+                mock.patch('descriptions.pipeline.generate_description', generate):
+            job = claim_next_job()
+            with self.assertRaises(WorkerKilled):
+                run_job(job)
+            self.assertIsNone(claim_next_job())
+
+            self.stale(job)
+            self.assertEqual(recover_jobs(), 1)
+            job = claim_next_job()
+            self.assertEqual(job.attempts, 2)
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result['description'], 'A cat.')
+        self.assertEqual(job.result['frames_processed'], 3)
+        build_frame_parts.assert_called_once()
+        self.assertEqual([call.args[1] for call in generate.call_args_list], [frames, frames])
+        self.assertFalse(os.path.exists(os.path.join(settings.JOB_CHECKPOINT_DIR, str(job.id))))
+
+    def test_reclaimed_job_keeps_new_attempts_outcome(self):
+        self.make_job()
+        job = claim_next_job()
+
+        def describe(*args, **kwargs):
+            # This worker missed its heartbeat; another one reclaims the job meanwhile
+            self.stale(job)
+            recover_jobs()
+            claim_next_job()
+            return {'description_text': 'A cat.', 'frames_processed': 1, 'payload_bytes': 5, 'cached': False}
+
+        with mock.patch('descriptions.jobs.describe_video', describe), self.assertLogs('descriptions.jobs', 'WARNING'):
+            run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('running', 2))
+        self.assertEqual(job.result, {})
+
+
+class GrowingFilePipeTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.path = os.path.join(self.dir, 'download.part')
+
+    def write_slowly(self, data, pipe, chunk_size=4096):
+        def write():
+            with open(self.path, 'wb') as f:
+                for i in range(0, len(data), chunk_size):
+                    f.write(data[i:i + chunk_size])
+                    f.flush()
+                    time.sleep(0.001)
+            pipe.finish()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_reader_gets_whole_file_as_it_grows(self):
+        data = os.urandom(100000)
+        with GrowingFilePipe(self.path, poll_interval=0.01) as pipe:
+            self.write_slowly(data, pipe)
+            with open(pipe.path, 'rb') as stream:
+                self.assertEqual(stream.read(), data)
+        self.assertEqual(pipe.bytes_copied, len(data))
+
+    def test_missing_file_ends_stream_once_finished(self):
+        with GrowingFilePipe(self.path, poll_interval=0.01) as pipe:
+            pipe.finish()
+            with open(pipe.path, 'rb') as stream:
+                self.assertEqual(stream.read(), b'')
+
+    def test_close_without_reader(self):
+        pipe = GrowingFilePipe(self.path, poll_interval=0.01)
+        start = time.monotonic()
+        pipe.close()
+        self.assertLess(time.monotonic() - start, 2)
+        self.assertFalse(os.path.exists(pipe.path))
+
+    def test_frames_decoded_from_pipe(self):
+        video_path = os.path.join(self.dir, 'clip.avi')
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        for i in range(50):
+            writer.write(np.full((48, 64, 3), i * 5, np.uint8))
+        writer.release()
+        with open(video_path, 'rb') as f:
+            data = f.read()
+
+        processor = VideoProcessor(api_key='test')
+        with GrowingFilePipe(self.path, poll_interval=0.01) as pipe:
+            self.write_slowly(data, pipe)
+            frames = list(processor.iter_stream_frames(pipe.path, fps=10, duration=5, frame_interval=1))
+        self.assertEqual(len(frames), 50)
+
+    def test_undecodable_stream_falls_back_to_finished_file(self):
+        data = os.urandom(100000)
+        parts = [{'mime_type': 'image/jpeg', 'data': b'frame'}]
+
+        def download(url, progress_hook):
+            with open(self.path, 'wb') as f:
+                progress_hook({'status': 'downloading', 'filename': self.path, 'info_dict': {'fps': 10, 'duration': 5}})
+                for i in range(0, len(data), 4096):
+                    f.write(data[i:i + 4096])
+                    f.flush()
+            return self.path, 'Noise'
+
+        with mock.patch.object(pipeline, 'download_youtube_video', download), \
+                mock.patch.object(pipeline, 'build_frame_parts', return_value=parts) as build_frame_parts:
+            result = pipeline._download_and_decode(VideoProcessor(api_key='test'), 'https://youtu.be/abcdefghijk')
+        self.assertEqual(result, (self.path, 'Noise', parts))
+        build_frame_parts.assert_called_once_with(mock.ANY, self.path)
+
+
+class FakeSegment:
+    """Stands in for pydub's AudioSegment, recording which chunks were joined in what order."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    @classmethod
+    def from_file(cls, data, format):
+        return cls([data.read().decode()])
+
+    @classmethod
+    def silent(cls, duration):
+        return cls([])
+
+    def __add__(self, other):
+        return FakeSegment(self.chunks + other.chunks)
+
+    def export(self, path, format):
+        FakeSegment.exported.append(self.chunks)
+
+
+class HumeChunkTests(SimpleTestCase):
+    def setUp(self):
+        with mock.patch('text_to_speech_hume.nltk.data.find'):
+            self.tts = HumeTTS(max_concurrency=3)
+        self.enterContext(mock.patch('text_to_speech_hume.AudioSegment', FakeSegment))
+        FakeSegment.exported = []
+
+    def test_chunks_joined_in_order_when_finishing_out_of_order(self):
+        async def generate(text, chunk_index=None):
+            await asyncio.sleep(0.03 * (3 - chunk_index))  # Last chunk finishes first
+            return text.encode()
+
+        with mock.patch.object(self.tts, '_generate_audio_with_retry', generate):
+            asyncio.run(self.tts._process_chunks(['one', 'two', 'three'], None, 'out.mp3'))
+        self.assertEqual(FakeSegment.exported, [['one', 'two', 'three']])
+
+    def test_failed_chunk_cancels_the_others(self):
+        cancelled = []
+
+        async def generate(text, chunk_index=None):
+            if text == 'bad':
+                raise RuntimeError("synthesis failed")
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(text)
+                raise
+
+        with mock.patch.object(self.tts, '_generate_audio_with_retry', generate), \
+                self.assertLogs('text_to_speech_hume', 'ERROR'), self.assertRaises(RuntimeError):
+            asyncio.run(self.tts._process_chunks(['one', 'bad', 'three'], None, 'out.mp3'))
+        self.assertEqual(sorted(cancelled), ['one', 'three'])
+        self.assertEqual(FakeSegment.exported, [])
@@ -9,6 +9,12 @@ urlpatterns = [
     path('', include(router.urls)),
     path('process-video/', views.process_video, name='process-video'),
     path('process-youtube/', views.process_youtube, name='process-youtube'),
+    path('process-video/stream/', views.process_video_stream, name='process-video-stream'),
+    path('process-youtube/stream/', views.process_youtube_stream, name='process-youtube-stream'),
+    path('jobs/', views.create_job, name='create-job'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job-status'),
+    path('profiles/<uuid:profile_id>/', views.profile_report, name='profile-report'),
+    path('profiles/<uuid:profile_id>/<str:filename>', views.profile_report, name='profile-file'),
     path('audio/<str:filename>', views.get_audio, name='get-audio'),
     path('generate-audio/', views.generate_audio, name='generate-audio'),
     path('generate_audio/', views.generate_audio, name='generate_audio'),
@@ -6,36 +6,62 @@ python manage.py runserver
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.decorators import action, api_view
-from .models import AudioDescription
-from .serializers import AudioDescriptionSerializer
-from django.http import JsonResponse, FileResponse
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from .models import AudioDescription, ProcessingJob
+from .serializers import AudioDescriptionSerializer, ProcessingJobSerializer
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 import os
 from pathlib import Path
 import tempfile
-from video_processing import VideoProcessor
 from django.conf import settings
+from django.urls import reverse
 import uuid
 import mimetypes
 import logging
+import hashlib
 import time
 from gtts import gTTS
-import yt_dlp
-from audio_processor import AudioProcessor
 from text_to_speech_hume import HumeTTS
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import asyncio
+from asgiref.sync import sync_to_async
 from text_to_speech_factory import TTSFactory, TTSProvider, get_recommended_provider
+from metrics import get_stage_metrics, track
+from outbound import deadline_scope
+from .admission import StageOverloaded, astage_slot, stage_slot
+from .jobs import submit_job
+from .profiling import PROFILE_FILES, profile_dir, profile_request
+from .scheduling import LANES, choose_lane
+from .pipeline import (
+    PipelineError,
+    YouTubeDownloadError,
+    adescribe_video,
+    afetch_youtube_frames,
+    afetch_youtube_video,
+    audio_processor,
+    build_frame_parts,
+    describe_video,
+    description_cache,
+    description_cache_key,
+    fetch_youtube_video,
+    get_video_processor,
+    youtube_video_id,
+)
+from .singleflight import SingleFlight
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize AudioProcessor and HumeTTS
-audio_processor = AudioProcessor()
+# Initialize HumeTTS
 hume_tts = HumeTTS()
 
+# Identical generate_audio requests in flight share one synthesis
+audio_flights = SingleFlight()
+
 # Create your views here.
 
 class AudioDescriptionViewSet(viewsets.ModelViewSet):
@@ -61,8 +87,12 @@ def is_valid_video_file(file):
     logger.debug(f"File type detected: {file_type}")
     return file_type in valid_types
 
+@track('upload_save')
 def save_uploaded_file(file, directory='videos'):
-    """Save an uploaded file to a permanent location."""
+    """
+    Save an uploaded file to a permanent location.
+    Returns the file path and the SHA-256 of its content, hashed as chunks are written.
+    """
     start_time = time.time()
     logger.debug(f"Starting file upload: {file.name}")
     
@@ -77,9 +107,11 @@ def save_uploaded_file(file, directory='videos'):
     
     # Save file
     file_size = 0
+    content_hash = hashlib.sha256()
     with open(filepath, 'wb+') as destination:
         for chunk in file.chunks():
             destination.write(chunk)
+            content_hash.update(chunk)
             file_size += len(chunk)
     
     duration = time.time() - start_time
@@ -87,9 +119,21 @@ def save_uploaded_file(file, directory='videos'):
     logger.debug(f"Upload completed in {duration:.2f} seconds")
     logger.debug(f"File size: {file_size / (1024*1024):.2f} MB")
     
-    return filepath
+    return filepath, content_hash.hexdigest()
+
+def server_busy_response(error):
+    """503 for a request turned away by admission control, with a Retry-After hint."""
+    response = JsonResponse({
+        'error': str(error),
+        'status': 'error',
+        'stage': error.stage,
+        'retry_after': error.retry_after
+    }, status=503)
+    response['Retry-After'] = str(error.retry_after)
+    return response
 
 @api_view(['POST'])
+@profile_request
 def process_video(request):
     """
     Process a video file to generate description.
@@ -128,12 +172,40 @@ def process_video(request):
     try:
         # Save video file permanently
         logger.debug("Saving video file")
-        video_path = save_uploaded_file(video_file)
+        video_path, content_hash = save_uploaded_file(video_file)
         processing_status['stage'] = 'video_saved'
         processing_status['progress'] = 20
         logger.debug(f"Video saved to: {video_path}")
+
+        cache_key = description_cache_key(f"sha256:{content_hash}")
+        cached = description_cache.get(cache_key) if settings.DESCRIPTION_CACHE_ENABLED else None
+        if cached:
+            logger.debug(f"Description cache hit for {video_file.name}")
+            description = AudioDescription.objects.create(
+                input_text=video_file.name,
+                input_type='video',
+                description_text=cached['description_text'],
+                description_length='medium',
+                user_id=request.data.get('user_id', 'anonymous')
+            )
+            return Response({
+                'status': 'success',
+                'description': cached['description_text'],
+                'description_id': description.id,
+                'video_path': os.path.relpath(video_path, settings.MEDIA_ROOT),
+                'processing_time': time.time() - processing_start,
+                'frames_processed': cached['metadata'].get('frames_processed'),
+                'payload_bytes': cached['metadata'].get('payload_bytes'),
+                'description_length': len(cached['description_text']),
+                'cached': True,
+                'stages_completed': [
+                    'upload',
+                    'cache_lookup',
+                    'database_storage'
+                ]
+            })
         
-        # Initialize video processor with API key from settings
+        # Check the Gemini API key from settings
         api_key = settings.GOOGLE_API_KEY
         if not api_key:
             logger.error("Google API key not found in settings")
@@ -143,36 +215,25 @@ def process_video(request):
                 'stage': 'api_initialization'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
-        logger.debug("Initializing video processor")
-        processor = VideoProcessor(api_key=api_key)
-        processing_status['stage'] = 'extracting_frames'
-        processing_status['progress'] = 30
+        def on_stage(stage, progress):
+            processing_status['stage'] = stage
+            processing_status['progress'] = progress
 
-        # Extract frames and generate description
-        logger.debug("Extracting frames from video")
-        frames = processor.extract_frames(video_path, frame_interval=10)
-        if not frames:
-            logger.error("Failed to extract frames from video")
-            return Response({
-                'error': 'Failed to extract frames from video',
-                'status': 'error',
-                'stage': 'frame_extraction'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        logger.debug(f"Extracted {len(frames)} frames")
-        processing_status['stage'] = 'generating_description'
-        processing_status['progress'] = 50
-
-        logger.debug("Generating description using Gemini")
-        description_text = processor.generate_description(frames)
-        if not description_text:
-            logger.error("Failed to generate description")
+        # Extract frames and generate description, or wait for an identical
+        # upload that is already being processed
+        logger.debug("Extracting frames and generating description")
+        try:
+            with deadline_scope(settings.OUTBOUND_INTERACTIVE_DEADLINE):
+                outcome = describe_video(video_path, cache_key, on_stage=on_stage, blocking=False)
+        except PipelineError as e:
+            logger.error(str(e))
             return Response({
-                'error': 'Failed to generate description',
+                'error': str(e),
                 'status': 'error',
-                'stage': 'description_generation'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'stage': e.stage
+            }, status=status.HTTP_400_BAD_REQUEST if e.stage == 'frame_extraction' else status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+        description_text = outcome['description_text']
         logger.debug(f"Generated description (length: {len(description_text)} chars)")
         processing_status['stage'] = 'saving_to_database'
         processing_status['progress'] = 90
@@ -197,8 +258,11 @@ def process_video(request):
             'description_id': description.id,
             'video_path': os.path.relpath(video_path, settings.MEDIA_ROOT),
             'processing_time': processing_duration,
-            'frames_processed': len(frames),
+            'frames_processed': outcome['frames_processed'],
+            'payload_bytes': outcome['payload_bytes'],
             'description_length': len(description_text),
+            'cached': outcome['cached'],
+            'shared': outcome['shared'],
             'stages_completed': [
                 'upload',
                 'frame_extraction',
@@ -207,6 +271,9 @@ def process_video(request):
             ]
         })
 
+    except StageOverloaded as e:
+        logger.warning(f"Rejected video processing request: {str(e)}")
+        return server_busy_response(e)
     except Exception as e:
         logger.error(f"Error during video processing: {str(e)}", exc_info=True)
         return Response({
@@ -217,149 +284,413 @@ def process_video(request):
             'processing_time': time.time() - processing_start
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['POST'])
-def process_youtube(request):
+@csrf_exempt
+@require_http_methods(["POST"])
+async def process_youtube(request):
     """
     Process a YouTube URL to generate description.
-    Expects a YouTube URL in the request body.
+    Expects a YouTube URL in the request body (JSON or form data).
     Downloads the video in 240p resolution using yt-dlp.
+
+    Runs as an async view: Gemini is awaited on the event loop while the
+    download, frame decoding and cache I/O run in the default thread pool.
     """
-    youtube_url = request.data.get('youtube_url')
+    if request.content_type == 'application/json':
+        try:
+            params = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    else:
+        params = request.POST
+    youtube_url = params.get('youtube_url')
     if not youtube_url:
-        return Response({'error': 'No YouTube URL provided'}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'error': 'No YouTube URL provided'}, status=400)
+    user_id = params.get('user_id', 'anonymous')
 
     try:
-        # Create videos directory if it doesn't exist
-        upload_dir = os.path.join(settings.MEDIA_ROOT, 'videos')
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # Generate unique filename
-        filename = f"{uuid.uuid4()}.mp4"
-        output_path = os.path.join(upload_dir, filename)
-
-        def my_hook(d):
-            if d['status'] == 'downloading':
-                logger.debug(f"Downloading: {d.get('_percent_str', '0%')} of {d.get('_total_bytes_str', 'unknown size')}")
-            elif d['status'] == 'finished':
-                logger.debug('Download complete')
-
-        # Configure yt-dlp options
-        ydl_opts = {
-            'format': 'worst',  # Always select the lowest quality available
-            'outtmpl': output_path,
-            'progress_hooks': [my_hook],
-            'verbose': True,
-            'no_warnings': False,
-            'extract_flat': False,
-            'quiet': False,
-        }
+        video_id = youtube_video_id(youtube_url)
+        cache_key = description_cache_key(f"youtube:{video_id}") if video_id else None
+        cached = None
+        if cache_key and settings.DESCRIPTION_CACHE_ENABLED:
+            cached = await sync_to_async(description_cache.get, thread_sensitive=False)(cache_key)
+        if cached:
+            logger.debug(f"Description cache hit for YouTube video {video_id}")
+            metadata = cached['metadata']
+            description = await AudioDescription.objects.acreate(
+                input_text=metadata.get('title', 'Untitled Video'),
+                input_type='youtube',
+                description_text=cached['description_text'],
+                description_length='medium',
+                user_id=user_id
+            )
+            return JsonResponse({
+                'status': 'success',
+                'title': metadata.get('title', 'Untitled Video'),
+                'description': cached['description_text'],
+                'description_id': description.id,
+                'video_path': metadata.get('video_path'),
+                'description_length': len(cached['description_text']),
+                'frames_processed': metadata.get('frames_processed'),
+                'payload_bytes': metadata.get('payload_bytes'),
+                'cached': True
+            })
 
-        # Download the video
-        logger.debug(f"Starting download of YouTube video: {youtube_url}")
-        logger.debug(f"Using options: {ydl_opts}")
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                # First, try to extract video information
-                info = ydl.extract_info(youtube_url, download=False)
-                
-                # Get video title
-                video_title = info.get('title', 'Untitled Video')
-                logger.debug(f"Video title: {video_title}")
-                
-                # Log available formats
-                logger.debug("Available formats:")
-                formats = sorted(info['formats'], key=lambda x: (x.get('width', 0) or 0) * (x.get('height', 0) or 0))
-                for f in formats:
-                    logger.debug(f"Format: {f.get('format_id', 'N/A')} - "
-                               f"Width: {f.get('width', 'N/A')}px - "
-                               f"Height: {f.get('height', 'N/A')}px - "
-                               f"Extension: {f.get('ext', 'N/A')} - "
-                               f"Filesize: {f.get('filesize', 'N/A')}")
-                
-                # Then download
-                logger.debug("Starting download with lowest quality format...")
-                ydl.download([youtube_url])
-                
-            except yt_dlp.utils.DownloadError as e:
-                logger.error(f"Download error: {str(e)}")
-                return Response({
-                    'error': f'Failed to download video: {str(e)}',
-                    'status': 'error',
-                    'available_formats': [f"{f.get('format_id', 'N/A')} - {f.get('width', 'N/A')}x{f.get('height', 'N/A')}" for f in formats]
-                }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            if settings.YOUTUBE_PROGRESSIVE_DECODE:
+                # Frames are extracted while the download is still running
+                output_path, video_title, image_parts = await afetch_youtube_frames(youtube_url)
+            else:
+                output_path, video_title = await afetch_youtube_video(youtube_url)
+                image_parts = None
+        except YouTubeDownloadError as e:
+            return JsonResponse({
+                'error': f'Failed to download video: {str(e)}',
+                'status': 'error',
+                'available_formats': e.available_formats
+            }, status=400)
+        except PipelineError as e:
+            return JsonResponse({
+                'error': str(e),
+                'status': 'error'
+            }, status=400)
 
         if not os.path.exists(output_path):
-            return Response({
+            return JsonResponse({
                 'error': 'Failed to download video - file not created',
                 'status': 'error'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=500)
 
         logger.debug(f"Video downloaded successfully to: {output_path}")
 
-        # Initialize video processor
+        # Check the Gemini API key
         api_key = settings.GOOGLE_API_KEY
         if not api_key:
-            return Response({
+            return JsonResponse({
                 'error': 'Google API key not configured',
                 'status': 'error'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        processor = VideoProcessor(api_key=api_key)
+            }, status=500)
 
         # Extract frames and generate description
-        frames = processor.extract_frames(output_path, frame_interval=10)
-        if not frames:
-            return Response({
-                'error': 'Failed to extract frames from video',
-                'status': 'error'
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        description_text = processor.generate_description(frames)
-        if not description_text:
-            return Response({
-                'error': 'Failed to generate description',
+        try:
+            with deadline_scope(settings.OUTBOUND_INTERACTIVE_DEADLINE):
+                outcome = await adescribe_video(output_path, cache_key, {
+                    'title': video_title,
+                    'video_path': os.path.relpath(output_path, settings.MEDIA_ROOT)
+                }, image_parts=image_parts)
+        except PipelineError as e:
+            return JsonResponse({
+                'error': str(e),
                 'status': 'error'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=400 if e.stage == 'frame_extraction' else 500)
+        description_text = outcome['description_text']
 
         # Store the description in the database using the video title
-        description = AudioDescription.objects.create(
+        description = await AudioDescription.objects.acreate(
             input_text=video_title,  # Use video title instead of URL
             input_type='youtube',
             description_text=description_text,
             description_length='medium',
-            user_id=request.data.get('user_id', 'anonymous')
+            user_id=user_id
         )
 
-        return Response({
+        return JsonResponse({
             'status': 'success',
             'title': video_title,  # Include title in response
             'description': description_text,
             'description_id': description.id,
             'video_path': os.path.relpath(output_path, settings.MEDIA_ROOT),
-            'description_length': len(description_text)
+            'description_length': len(description_text),
+            'frames_processed': outcome['frames_processed'],
+            'payload_bytes': outcome['payload_bytes'],
+            'cached': outcome['cached'],
+            'shared': outcome['shared']
         })
 
+    except StageOverloaded as e:
+        logger.warning(f"Rejected YouTube processing request: {str(e)}")
+        return server_busy_response(e)
     except Exception as e:
         logger.error(f"Error processing YouTube video: {str(e)}", exc_info=True)
-        return Response({
+        return JsonResponse({
             'error': str(e),
             'status': 'error'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        }, status=500)
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_description_events(video_path, input_text, input_type, user_id, cache_key, extra=None):
+    """
+    Generate a description for a saved video and yield it as Server-Sent Events.
+
+    Emits `stage` events while frames are extracted, `chunk` events as Gemini
+    produces text, and a final `done` event once the full description has been
+    saved to AudioDescription (or `error` if anything fails).
+    """
+    extra = extra or {}
+    try:
+        cached = description_cache.get(cache_key) if cache_key and settings.DESCRIPTION_CACHE_ENABLED else None
+        if cached:
+            description_text = cached['description_text']
+            yield sse_event('chunk', {'text': description_text})
+        else:
+            yield sse_event('stage', {'stage': 'frame_extraction'})
+            processor = get_video_processor(settings.GOOGLE_API_KEY)
+            with stage_slot('decode'):
+                image_parts = build_frame_parts(processor, video_path)
+            if not image_parts:
+                yield sse_event('error', {'error': 'Failed to extract frames from video', 'stage': 'frame_extraction'})
+                return
+
+            yield sse_event('stage', {'stage': 'description_generation', 'frames_processed': len(image_parts)})
+            chunks = []
+            for text in processor.stream_description(
+                image_parts,
+                window_size=settings.GEMINI_SEGMENT_FRAMES,
+                max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+                slot=stage_slot('gemini')
+            ):
+                chunks.append(text)
+                yield sse_event('chunk', {'text': text})
+            description_text = ''.join(chunks)
+            if not description_text:
+                yield sse_event('error', {'error': 'Failed to generate description', 'stage': 'description_generation'})
+                return
+
+            if cache_key and settings.DESCRIPTION_CACHE_ENABLED:
+                description_cache.put(cache_key, description_text, [part['data'] for part in image_parts], {
+                    **extra,
+                    'frames_processed': len(image_parts),
+                    'payload_bytes': processor.payload_size(image_parts),
+                })
+
+        description = AudioDescription.objects.create(
+            input_text=input_text,
+            input_type=input_type,
+            description_text=description_text,
+            description_length='medium',
+            user_id=user_id
+        )
+        yield sse_event('done', {
+            **extra,
+            'status': 'success',
+            'description': description_text,
+            'description_id': description.id,
+            'description_length': len(description_text),
+            'cached': bool(cached)
+        })
+    except StageOverloaded as e:
+        logger.warning(f"Rejected streaming request: {str(e)}")
+        yield sse_event('error', {'error': str(e), 'stage': e.stage, 'retry_after': e.retry_after})
+    except Exception as e:
+        logger.error(f"Error streaming description: {str(e)}", exc_info=True)
+        yield sse_event('error', {'error': str(e)})
+
+def event_stream_response(events):
+    """Wrap an event generator in an unbuffered text/event-stream response."""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def process_video_stream(request):
+    """
+    Process a video file and stream the description as Server-Sent Events.
+    Expects a video file in the request; the text is pushed as it is generated.
+    """
+    if 'video' not in request.FILES:
+        return JsonResponse({'error': 'No video file provided', 'status': 'error'}, status=400)
+
+    video_file = request.FILES['video']
+    if not is_valid_video_file(video_file):
+        return JsonResponse({
+            'error': 'Invalid video file format. Please upload MP4, AVI, MOV, or similar video files.',
+            'status': 'error'
+        }, status=400)
+
+    video_path, content_hash = save_uploaded_file(video_file)
+    return event_stream_response(stream_description_events(
+        video_path,
+        input_text=video_file.name,
+        input_type='video',
+        user_id=request.POST.get('user_id', 'anonymous'),
+        cache_key=description_cache_key(f"sha256:{content_hash}"),
+        extra={'video_path': os.path.relpath(video_path, settings.MEDIA_ROOT)}
+    ))
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def process_youtube_stream(request):
+    """
+    Process a YouTube URL and stream the description as Server-Sent Events.
+    Accepts `youtube_url` in a JSON body or, for EventSource clients, the query string.
+    """
+    if request.method == 'POST':
+        try:
+            params = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    else:
+        params = request.GET
+    youtube_url = params.get('youtube_url')
+    if not youtube_url:
+        return JsonResponse({'error': 'No YouTube URL provided'}, status=400)
+    user_id = params.get('user_id', 'anonymous')
+
+    def events():
+        video_id = youtube_video_id(youtube_url)
+        cache_key = description_cache_key(f"youtube:{video_id}") if video_id else None
+        cached = description_cache.get(cache_key) if cache_key and settings.DESCRIPTION_CACHE_ENABLED else None
+        if cached:
+            metadata = cached['metadata']
+            yield from stream_description_events(
+                None, metadata.get('title', 'Untitled Video'), 'youtube', user_id, cache_key, extra=metadata
+            )
+            return
+
+        yield sse_event('stage', {'stage': 'download'})
+        try:
+            output_path, video_title = fetch_youtube_video(youtube_url)
+        except YouTubeDownloadError as e:
+            yield sse_event('error', {
+                'error': f'Failed to download video: {str(e)}',
+                'available_formats': e.available_formats
+            })
+            return
+        except Exception as e:
+            logger.error(f"Error downloading YouTube video: {str(e)}", exc_info=True)
+            yield sse_event('error', {'error': str(e)})
+            return
+
+        yield sse_event('stage', {'stage': 'downloaded', 'title': video_title})
+        yield from stream_description_events(output_path, video_title, 'youtube', user_id, cache_key, extra={
+            'title': video_title,
+            'video_path': os.path.relpath(output_path, settings.MEDIA_ROOT)
+        })
+
+    return event_stream_response(events())
+
+@api_view(['POST'])
+def create_job(request):
+    """
+    Queue a video file or YouTube URL for background processing.
+    Returns the job ID immediately; poll /api/jobs/<id>/ for progress and the result.
+
+    With `output` set to 'audio' the job also narrates the description with
+    `tts_provider` (recommended from the text if omitted) and mixes in music.
+
+    `lane` ('interactive' or 'bulk') sets the job's scheduling lane; by
+    default short uploads and YouTube Shorts are interactive.
+    """
+    user_id = request.data.get('user_id', 'anonymous')
+    output = request.data.get('output', 'text')
+    if output not in ('text', 'audio'):
+        return Response({
+            'error': f'Invalid output: {output}',
+            'status': 'error',
+            'stage': 'validation'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    suffix = '_audio' if output == 'audio' else ''
+
+    tts_provider = request.data.get('tts_provider')
+    if tts_provider:
+        try:
+            tts_provider = TTSProvider(tts_provider.lower()).value
+        except ValueError:
+            return Response({
+                'error': f'Invalid TTS provider: {tts_provider}',
+                'status': 'error',
+                'stage': 'validation'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    lane = request.data.get('lane')
+    if lane is not None and lane not in LANES:
+        return Response({
+            'error': f'Invalid lane: {lane}',
+            'status': 'error',
+            'stage': 'validation'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if 'video' in request.FILES:
+        video_file = request.FILES['video']
+        if not is_valid_video_file(video_file):
+            return Response({
+                'error': 'Invalid video file format. Please upload MP4, AVI, MOV, or similar video files.',
+                'status': 'error',
+                'stage': 'validation'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        video_path, content_hash = save_uploaded_file(video_file)
+        job = submit_job('video' + suffix, video_file.name, user_id, video_path=video_path,
+                         cache_key=description_cache_key(f"sha256:{content_hash}"), tts_provider=tts_provider,
+                         lane=lane or choose_lane('video', upload_size=video_file.size))
+    elif request.data.get('youtube_url'):
+        youtube_url = request.data['youtube_url']
+        video_id = youtube_video_id(youtube_url)
+        job = submit_job('youtube' + suffix, youtube_url, user_id,
+                         cache_key=description_cache_key(f"youtube:{video_id}") if video_id else None,
+                         tts_provider=tts_provider, lane=lane or choose_lane('youtube', youtube_url=youtube_url))
+    else:
+        return Response({
+            'error': 'No video file or YouTube URL provided',
+            'status': 'error',
+            'stage': 'validation'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': reverse('job-status', args=[job.id])
+    }, status=status.HTTP_202_ACCEPTED)
 
 @api_view(['GET'])
-def get_audio(request, filename):
+def job_status(request, job_id):
+    """
+    Report the stage, progress, timings and, once finished, the result of a job.
+    """
+    try:
+        job = ProcessingJob.objects.get(id=job_id)
+    except ProcessingJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(ProcessingJobSerializer(job).data)
+
+async def iter_file(path, chunk_size=64 * 1024):
+    """Read a file in chunks without blocking the event loop."""
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+def audio_file_response(path):
+    """Stream an MP3 file from an async view."""
+    response = StreamingHttpResponse(iter_file(path), content_type='audio/mpeg')
+    response['Content-Length'] = os.path.getsize(path)
+    return response
+
+@require_http_methods(["GET"])
+async def get_audio(request, filename):
     """
     Serve the generated audio file.
     """
     audio_path = os.path.join('audio_outputs', filename)
     if os.path.exists(audio_path):
-        return FileResponse(open(audio_path, 'rb'), content_type='audio/mpeg')
-    return Response({'error': 'Audio file not found'}, status=status.HTTP_404_NOT_FOUND)
+        return audio_file_response(audio_path)
+    return JsonResponse({'error': 'Audio file not found'}, status=404)
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def generate_audio(request):
+@profile_request
+async def generate_audio(request):
+    """
+    Narrate text with a TTS provider and mix in background music.
+
+    TTS is awaited on the event loop (or run in the thread pool for
+    providers without an async client) and mixing runs in the thread pool.
+    """
     try:
         data = json.loads(request.body)
         text = data.get('text', '')
@@ -381,39 +712,49 @@ def generate_audio(request):
         # Generate unique filename based on description_id if provided
         filename = f"{description_id}_audio.mp3" if description_id else f"{uuid.uuid4()}_audio.mp3"
 
-        # Generate audio file
-        try:
-            narration_path = TTSFactory.text_to_speech(
-                text=text,
-                provider=provider,
-                filename=filename
-            )
+        async def synthesize():
+            async with astage_slot('tts'):
+                narration_path = await TTSFactory.text_to_speech_async(
+                    text=text,
+                    provider=provider,
+                    filename=filename
+                )
             
             # Mix narration with background music
-            mixed_audio_path = audio_processor.mix_audio(
-                narration_path=narration_path,
-                narration_text=text  # Pass the text for mood analysis
-            )
+            async with astage_slot('mix'):
+                return await sync_to_async(audio_processor.mix_audio, thread_sensitive=False)(
+                    narration_path=narration_path,
+                    narration_text=text  # Pass the text for mood analysis
+                )
+
+        # Generate audio file, or reuse the one an identical request is producing
+        try:
+            with deadline_scope(settings.OUTBOUND_INTERACTIVE_DEADLINE):
+                mixed_audio_path, shared = await audio_flights.ado((text, provider.value), synthesize)
             
             # Get the relative path for storage in the database
             mixed_filename = os.path.basename(mixed_audio_path)
             
+        except StageOverloaded as e:
+            logger.warning(f"Rejected audio generation request: {str(e)}")
+            return server_busy_response(e)
         except Exception as e:
             return JsonResponse({'error': f'Audio generation failed: {str(e)}'}, status=500)
 
         # Update or create AudioDescription if description_id is provided
         if description_id:
             try:
-                audio_desc = AudioDescription.objects.get(id=description_id)
+                audio_desc = await AudioDescription.objects.aget(id=description_id)
                 audio_desc.audio_url = mixed_filename
-                audio_desc.save()
+                await audio_desc.asave()
             except AudioDescription.DoesNotExist:
                 return JsonResponse({'error': 'Description not found'}, status=404)
 
         # Return the audio file path
         return JsonResponse({
             'audio_url': mixed_filename,
-            'provider_used': provider.value
+            'provider_used': provider.value,
+            'shared': shared
         })
 
     except json.JSONDecodeError:
@@ -423,7 +764,7 @@ def generate_audio(request):
 
 @csrf_exempt
 @require_http_methods(["GET"])
-def serve_audio(request, filename):
+async def serve_audio(request, filename):
     """
     Serve audio files from the audio_outputs directory
     """
@@ -437,7 +778,37 @@ def serve_audio(request, filename):
             return JsonResponse({'error': 'Audio file not found'}, status=404)
         
         # Return the file
-        return FileResponse(open(file_path, 'rb'), content_type='audio/mpeg')
+        return audio_file_response(file_path)
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def stage_metrics(request):
+    """Per-stage latency histograms, counters and in-flight gauges in the Prometheus text format."""
+    return HttpResponse(get_stage_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profile_report(request, profile_id, filename=None):
+    """
+    Get the summary of a request profile with links to its files, or
+    download one of the files.
+    """
+    report_dir = profile_dir(str(profile_id))
+    if filename is None:
+        summary_path = os.path.join(report_dir, 'summary.json')
+        if not os.path.exists(summary_path):
+            return JsonResponse({'error': 'Profile not found'}, status=404)
+        with open(summary_path) as f:
+            summary = json.load(f)
+        summary['files'] = {
+            name: request.build_absolute_uri(reverse('profile-file', args=[profile_id, name]))
+            for name in PROFILE_FILES
+        }
+        return Response(summary)
+
+    path = os.path.join(report_dir, filename)
+    if filename not in PROFILE_FILES or not os.path.exists(path):
+        return JsonResponse({'error': 'Profile file not found'}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{profile_id}-{filename}")
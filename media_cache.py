@@ -0,0 +1,227 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+class MediaCache:
+    """
+    Disk cache for downloaded videos, keyed by video ID and format.
+
+    Each entry is a directory named `<video id>-<format id>` holding the
+    video file and `meta.json` (title, duration and how the format was
+    chosen). Downloads are written to a temporary directory from `reserve`
+    and renamed into place by `commit`, so readers never see a partial
+    file. The modification time of `meta.json` is refreshed on every hit
+    and the least recently used entries are evicted once the cache grows
+    past `max_bytes`.
+    """
+
+    STALE_TEMP_SECONDS = 24 * 3600  # Temporary directories older than this were left by crashed downloads
+
+    def __init__(self, cache_dir: str = "media/youtube_cache", max_bytes: int = 2 * 1024 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries, created on the first `reserve`
+            max_bytes: Maximum total size of the cache on disk
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(video_id: str, format_id: Optional[str]) -> str:
+        """
+        Build the entry name for a video in one format.
+
+        Args:
+            video_id: Canonical video ID
+            format_id: Format ID reported by the downloader
+
+        Returns:
+            Directory name of the cache entry
+        """
+        return f"{video_id}-{re.sub(r'[^A-Za-z0-9_.-]', '_', format_id or 'default')}"
+
+    def find(self, video_id: str, match: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up the most recently used cached download of a video.
+
+        Args:
+            video_id: Canonical video ID
+            match: Metadata values the entry must have, e.g. the format selection settings (optional)
+
+        Returns:
+            Dict with `key`, `path` of the video file and `metadata`, or None on a miss
+        """
+        hits = []
+        for entry_dir in self.cache_dir.glob(f"{video_id}-*"):
+            meta_file = entry_dir / "meta.json"
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                last_used = meta_file.stat().st_mtime
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+            metadata = entry.get("metadata", {})
+            if entry.get("video_id") != video_id:
+                continue  # Another ID that starts with this one and a dash
+            if any(metadata.get(name) != value for name, value in (match or {}).items()):
+                continue
+            path = entry_dir / entry["filename"]
+            if path.exists():
+                hits.append((last_used, entry_dir.name, str(path), metadata, meta_file))
+
+        if not hits:
+            return None
+        _, key, path, metadata, meta_file = max(hits)
+        try:
+            os.utime(meta_file)  # Mark as recently used
+        except FileNotFoundError:
+            return None  # Evicted in the meantime
+        return {"key": key, "path": path, "metadata": metadata}
+
+    def reserve(self) -> str:
+        """
+        Create a temporary directory to download into; pass it to `commit` or `discard`.
+
+        Returns:
+            Path of the directory
+        """
+        temp_dir = self.cache_dir / f".tmp-{uuid.uuid4()}"
+        temp_dir.mkdir(parents=True)
+        return str(temp_dir)
+
+    def discard(self, temp_dir: str) -> None:
+        """Remove a directory from `reserve` after a failed download."""
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def commit(
+        self,
+        temp_dir: str,
+        video_id: str,
+        format_id: Optional[str],
+        filename: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Move a finished download into the cache, then evict old entries if needed.
+
+        If another worker cached the same video and format in the meantime,
+        its entry is kept and this download is dropped.
+
+        Args:
+            temp_dir: Directory from `reserve` holding the video file
+            video_id: Canonical video ID
+            format_id: Format ID reported by the downloader
+            filename: Name of the video file inside `temp_dir`
+            metadata: Extra JSON-serializable data returned by `find` (optional)
+
+        Returns:
+            Path of the cached video file
+        """
+        key = self.make_key(video_id, format_id)
+        entry_dir = self.cache_dir / key
+        try:
+            with open(Path(temp_dir) / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "video_id": video_id,
+                    "format_id": format_id,
+                    "filename": filename,
+                    "metadata": metadata or {},
+                    "created_at": time.time(),
+                }, f)
+            os.replace(temp_dir, entry_dir)
+        except OSError:
+            self.discard(temp_dir)
+            if not (entry_dir / filename).exists():
+                raise
+            os.utime(entry_dir / "meta.json")
+
+        self.evict(keep=key)
+        return str(entry_dir / filename)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        List the cache entries, least recently used first.
+
+        Returns:
+            Dicts with `key`, `video_id`, `format_id`, `size`, `last_used` and `metadata`
+        """
+        entries = []
+        if not self.cache_dir.is_dir():
+            return entries
+        for entry_dir in self.cache_dir.iterdir():
+            if entry_dir.name.startswith("."):
+                continue
+            meta_file = entry_dir / "meta.json"
+            try:
+                with open(meta_file, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                size = sum(f.stat().st_size for f in entry_dir.iterdir())
+                last_used = meta_file.stat().st_mtime
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+            entries.append({
+                "key": entry_dir.name,
+                "video_id": entry.get("video_id"),
+                "format_id": entry.get("format_id"),
+                "size": size,
+                "last_used": last_used,
+                "metadata": entry.get("metadata", {}),
+            })
+        return sorted(entries, key=lambda entry: entry["last_used"])
+
+    def remove(self, video_id: Optional[str] = None) -> int:
+        """
+        Delete the entries of one video, or every entry.
+
+        Args:
+            video_id: Canonical video ID (optional; all entries when omitted)
+
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            for entry in self.entries():
+                if video_id is None or entry["video_id"] == video_id:
+                    shutil.rmtree(self.cache_dir / entry["key"], ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove least recently used entries until the cache fits in `max_bytes`,
+        and temporary directories left behind by crashed downloads.
+
+        Args:
+            keep: Key of an entry that must not be removed, such as the one just added (optional)
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            for temp_dir in self.cache_dir.glob(".tmp-*"):
+                try:
+                    if time.time() - temp_dir.stat().st_mtime > self.STALE_TEMP_SECONDS:
+                        shutil.rmtree(temp_dir, ignore_errors=True)
+                except FileNotFoundError:
+                    continue
+
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry["key"] == keep:
+                    continue
+                shutil.rmtree(self.cache_dir / entry["key"], ignore_errors=True)
+                total -= entry["size"]
+                removed += 1
+            return removed
@@ -0,0 +1,137 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; covers single JPEG encodes up to long TTS jobs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class StageMetrics:
+    """
+    In-process latency histograms, call counters and in-flight gauges per stage.
+
+    Stages are free-form names ("frame_extraction", "tts_hume", ...) created
+    on first use. `render` returns everything in the Prometheus text format:
+
+        blindtube_stage_duration_seconds   histogram, by stage
+        blindtube_stage_calls_total        counter, by stage and outcome (ok/error)
+        blindtube_stage_in_flight          gauge, by stage
+
+    Each process keeps its own numbers, so a server with several worker
+    processes is scraped per process. Stages that run in decode subprocesses
+    are not recorded.
+    """
+
+    PREFIX = "blindtube_stage"
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets: Histogram bucket upper bounds in seconds, ascending
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._calls: Dict[Tuple[str, str], int] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        """
+        Record one finished run of a stage.
+
+        Args:
+            stage: Stage name
+            seconds: How long the run took
+            error: Whether the run raised
+        """
+        outcome = "error" if error else "ok"
+        with self._lock:
+            counts = self._bucket_counts.setdefault(stage, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+            self._calls[(stage, outcome)] = self._calls.get((stage, outcome), 0) + 1
+
+    def _add_in_flight(self, stage: str, delta: int) -> None:
+        with self._lock:
+            self._in_flight[stage] = self._in_flight.get(stage, 0) + delta
+
+    @contextmanager
+    def track(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one run of `stage` and count it as in flight meanwhile.
+
+        Args:
+            stage: Stage name
+        """
+        self._add_in_flight(stage, 1)
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start, error)
+            self._add_in_flight(stage, -1)
+
+    def render(self) -> str:
+        """
+        Format all metrics in the Prometheus text exposition format.
+
+        Returns:
+            Metrics text, ending with a newline
+        """
+        with self._lock:
+            bucket_counts = {stage: list(counts) for stage, counts in self._bucket_counts.items()}
+            sums = dict(self._sums)
+            calls = dict(self._calls)
+            in_flight = dict(self._in_flight)
+
+        lines = [
+            f"# HELP {self.PREFIX}_duration_seconds Time spent in each processing stage.",
+            f"# TYPE {self.PREFIX}_duration_seconds histogram",
+        ]
+        for stage in sorted(bucket_counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), bucket_counts[stage]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_number(bound)
+                lines.append(f'{self.PREFIX}_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{self.PREFIX}_duration_seconds_sum{{stage="{stage}"}} {_format_number(sums[stage])}')
+            lines.append(f'{self.PREFIX}_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+
+        lines += [
+            f"# HELP {self.PREFIX}_calls_total Finished runs of each processing stage.",
+            f"# TYPE {self.PREFIX}_calls_total counter",
+        ]
+        for (stage, outcome), count in sorted(calls.items()):
+            lines.append(f'{self.PREFIX}_calls_total{{stage="{stage}",outcome="{outcome}"}} {count}')
+
+        lines += [
+            f"# HELP {self.PREFIX}_in_flight Runs of each processing stage in progress.",
+            f"# TYPE {self.PREFIX}_in_flight gauge",
+        ]
+        for stage, count in sorted(in_flight.items()):
+            lines.append(f'{self.PREFIX}_in_flight{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+_stage_metrics: Optional[StageMetrics] = None
+_stage_metrics_lock = threading.Lock()
+
+def get_stage_metrics() -> StageMetrics:
+    """Return the process-wide StageMetrics, creating it on first use."""
+    global _stage_metrics
+    with _stage_metrics_lock:
+        if _stage_metrics is None:
+            _stage_metrics = StageMetrics()
+        return _stage_metrics
+
+def track(stage: str):
+    """Context manager timing the enclosed block as one run of `stage` in the process-wide metrics."""
+    return get_stage_metrics().track(stage)
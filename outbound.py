@@ -0,0 +1,257 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Requests per second, bucket size and concurrent calls per provider, used
+# when Django settings (OUTBOUND_QUOTAS) are not available
+DEFAULT_QUOTAS = {
+    "gemini": {"rate": 2.0, "burst": 4, "concurrency": 4},
+    "hume": {"rate": 2.0, "burst": 4, "concurrency": 4},
+    "eleven_labs": {"rate": 1.0, "burst": 2, "concurrency": 2},
+    "gtts": {"rate": 2.0, "burst": 4, "concurrency": 4},
+}
+DEFAULT_DEADLINE = 300.0  # Seconds from now for calls made outside a deadline scope
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("outbound_deadline", default=None)
+
+class _Waiter:
+    """A call queued for its turn; `grant` starts it and returns False if it is gone."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.granted = False
+
+    def grant(self, limiter: "ProviderLimiter") -> bool:
+        if self.loop is None:
+            self.granted = True
+            return True
+        try:
+            self.loop.call_soon_threadsafe(limiter._resolve, self.future)
+        except RuntimeError:
+            return False  # The caller's event loop has closed
+        return True
+
+class ProviderLimiter:
+    """
+    Token bucket plus concurrency limit for the calls to one provider.
+
+    A call needs a token (refilled at `rate` per second, up to `burst`) and
+    one of `concurrency` slots. Waiting calls are served earliest deadline
+    first; calls with the same deadline are served in arrival order.
+    Threads wait on a condition and coroutines on a future, so a queued
+    async call holds no thread; a timer starts the next call once a token
+    is due.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int):
+        """
+        Args:
+            name: Provider name, for error messages
+            rate: Calls started per second, sustained
+            burst: Calls that can start at once after an idle period
+            concurrency: Calls allowed in progress at once
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.active = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._waiters = []  # Heap of (deadline, arrival, waiter) of waiting calls
+        self._arrivals = itertools.count()
+        self._timer: Optional[threading.Timer] = None
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _dispatch(self) -> None:
+        """Start waiting calls while slots and tokens allow; call with the lock held."""
+        self._refill()
+        while self._waiters and self.active < self.concurrency and self._tokens >= 1:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.grant(self):
+                self._tokens -= 1
+                self.active += 1
+        self._cond.notify_all()
+        if self._waiters and self.active < self.concurrency and self._timer is None:
+            # Only a token is missing; come back when one is due
+            self._timer = threading.Timer((1 - self._tokens) / self.rate, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._cond:
+            self._timer = None
+            self._dispatch()
+
+    def _enqueue(self, waiter: _Waiter, deadline: Optional[float]) -> None:
+        entry = (deadline if deadline is not None else float("inf"), next(self._arrivals), waiter)
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+
+    def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Block until this call may start.
+
+        Args:
+            deadline: `time.monotonic()` value the caller needs the result by;
+                earlier deadlines are served first
+        """
+        waiter = _Waiter()
+        with self._cond:
+            self._enqueue(waiter, deadline)
+            while not waiter.granted:
+                self._cond.wait()
+
+    async def aacquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Async `acquire`; waiting does not hold a thread.
+
+        Args:
+            deadline: `time.monotonic()` value the caller needs the result by
+        """
+        waiter = _Waiter(asyncio.get_running_loop())
+        with self._cond:
+            self._enqueue(waiter, deadline)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._cond:
+                queued = [entry for entry in self._waiters if entry[2] is waiter]
+                for entry in queued:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+            if not queued and waiter.future.done() and not waiter.future.cancelled():
+                self.release()  # Started just as we stopped waiting; a cancelled future is handled by _resolve
+            raise
+
+    def _resolve(self, future: asyncio.Future) -> None:
+        """Start a granted call on its event loop, or free the slot if the caller gave up."""
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        """Free the concurrency slot of a finished call."""
+        with self._cond:
+            self.active -= 1
+            self._dispatch()
+
+class OutboundScheduler:
+    """
+    Shared gate for the calls this process makes to AI providers.
+
+    Every Gemini and TTS request goes through `call` (or `acall`) with its
+    provider name, so bursts are smoothed to stay under the provider's
+    quota instead of running into 429s and retries. Limits apply per
+    process; divide the provider quota by the number of worker processes.
+    """
+
+    def __init__(self, quotas: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            quotas: Provider name to `rate`, `burst` and `concurrency`
+        """
+        self.limiters = {
+            name: ProviderLimiter(name, quota["rate"], quota["burst"], quota["concurrency"])
+            for name, quota in quotas.items()
+        }
+
+    def _limiter(self, provider: str) -> ProviderLimiter:
+        try:
+            return self.limiters[provider]
+        except KeyError:
+            raise ValueError(f"No outbound quota configured for provider: {provider}")
+
+    @contextmanager
+    def call(self, provider: str) -> Iterator[None]:
+        """
+        Wait for the provider's quota, then hold one of its slots for the enclosed block.
+
+        Args:
+            provider: Provider name from the quotas
+        """
+        limiter = self._limiter(provider)
+        limiter.acquire(current_deadline())
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def acall(self, provider: str):
+        """
+        Async `call`; the event loop keeps running while the call waits.
+
+        Args:
+            provider: Provider name from the quotas
+        """
+        limiter = self._limiter(provider)
+        await limiter.aacquire(current_deadline())
+        try:
+            yield
+        finally:
+            limiter.release()
+
+def current_deadline() -> float:
+    """Deadline of the current deadline scope, or DEFAULT_DEADLINE seconds from now."""
+    deadline = _deadline.get()
+    return deadline if deadline is not None else time.monotonic() + DEFAULT_DEADLINE
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    """
+    Give the outbound calls made in the enclosed block (including coroutines
+    and sync_to_async calls it starts) a deadline `seconds` from now, so
+    they are served ahead of calls with later deadlines.
+
+    Args:
+        seconds: Time budget for the calls
+    """
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+_scheduler: Optional[OutboundScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> OutboundScheduler:
+    """Return the process-wide scheduler, configured from settings.OUTBOUND_QUOTAS if Django is set up."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = OutboundScheduler(_configured_quotas())
+        return _scheduler
+
+def _configured_quotas() -> Dict[str, Dict[str, Any]]:
+    try:
+        from django.conf import settings
+        return getattr(settings, "OUTBOUND_QUOTAS", DEFAULT_QUOTAS)
+    except Exception:
+        # Run outside Django, e.g. a TTS module's __main__
+        return DEFAULT_QUOTAS
+
+def outbound_call(provider: str):
+    """Context manager holding a quota slot of `provider` in the process-wide scheduler."""
+    return get_scheduler().call(provider)
+
+def aoutbound_call(provider: str):
+    """Async context manager holding a quota slot of `provider` in the process-wide scheduler."""
+    return get_scheduler().acall(provider)
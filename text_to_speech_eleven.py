@@ -5,6 +5,8 @@ import uuid
 from elevenlabs import generate, save, set_api_key
 import requests
 
+from outbound import outbound_call
+
 class ElevenLabsTTS:
     """Eleven Labs Text-to-Speech implementation"""
     
@@ -47,7 +49,8 @@ class ElevenLabsTTS:
         }
         
         # Make the API request
-        response = requests.post(url, json=data, headers=headers)
+        with outbound_call("eleven_labs"):
+            response = requests.post(url, json=data, headers=headers)
         
         if response.status_code != 200:
             raise Exception(f"API request failed with status code {response.status_code}: {response.text}")
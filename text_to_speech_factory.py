@@ -1,8 +1,10 @@
+import asyncio
 from enum import Enum
 from typing import Optional
 from text_to_speech_google import GoogleTTS
 from text_to_speech_eleven import ElevenLabsTTS
 from text_to_speech_hume import HumeTTS
+from metrics import track
 
 class TTSProvider(Enum):
     GOOGLE = "google"
@@ -61,7 +63,39 @@ class TTSFactory:
             raise ValueError("Text is empty")
             
         tts = TTSFactory.create_tts(provider)
-        return tts.text_to_speech(text, output_dir, filename)
+        with track(f"tts_{provider.value}"):
+            return tts.text_to_speech(text, output_dir, filename)
+
+    @staticmethod
+    async def text_to_speech_async(
+        text: str,
+        provider: TTSProvider,
+        output_dir: str = "audio_outputs",
+        filename: Optional[str] = None
+    ) -> str:
+        """
+        Async version of text_to_speech
+        
+        Providers with a native async client are awaited directly; the others
+        run in the default thread pool so the event loop is never blocked.
+        
+        Args:
+            text (str): The text to convert to speech
+            provider (TTSProvider): The TTS provider to use
+            output_dir (str): Directory to store the audio output
+            filename (str, optional): Optional filename for the output file
+            
+        Returns:
+            str: Path to the generated audio file
+        """
+        if not text:
+            raise ValueError("Text is empty")
+            
+        tts = await asyncio.to_thread(TTSFactory.create_tts, provider)
+        with track(f"tts_{provider.value}"):
+            if hasattr(tts, "text_to_speech_async"):
+                return await tts.text_to_speech_async(text, output_dir, filename)
+            return await asyncio.to_thread(tts.text_to_speech, text, output_dir, filename)
 
 def get_recommended_provider(text: str) -> TTSProvider:
     """
@@ -4,6 +4,8 @@ from gtts import gTTS
 from typing import Optional
 import uuid
 
+from outbound import outbound_call
+
 class GoogleTTS:
     """Google Text-to-Speech implementation"""
     
@@ -33,7 +35,8 @@ class GoogleTTS:
         
         # Generate audio using gTTS
         tts = gTTS(text=text, lang='en', slow=False)
-        tts.save(str(output_file))
+        with outbound_call("gtts"):
+            tts.save(str(output_file))
         
         return str(output_file)
 
@@ -1,17 +1,22 @@
 import asyncio
+import atexit
+import io
+import logging
 import os
 import re
 import base64
 import ssl
+import threading
 import time
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Awaitable, Dict, Any, List, Optional, TypeVar
 from dotenv import load_dotenv
 from hume import HumeClient, AsyncHumeClient
 from hume.tts import PostedUtterance
 import uuid
 import nltk
 import aiohttp
+import httpx
 from tenacity.stop import stop_after_attempt
 from tenacity.wait import wait_exponential
 from tenacity import retry
@@ -25,14 +30,130 @@ else:
 
 from pydub import AudioSegment
 
+from metrics import track
+from outbound import aoutbound_call
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class HumeClientPool:
+    """
+    Long-lived AsyncHumeClient running on its own event loop thread.
+
+    The client's httpx connection pool is shared by every chunk and request
+    in the process, so connections and TLS sessions are reused instead of
+    being set up for each call. Callers on any event loop hand their calls
+    to the pool's loop with `arun`; synchronous callers use `run`.
+    """
+
+    MAX_CONNECTIONS = 16
+    KEEPALIVE_EXPIRY = 60  # Seconds an idle connection is kept open
+    READ_TIMEOUT = 60  # Seconds, the SDK's default when it creates its own client
+
+    def __init__(self, api_key: str, max_connections: int = MAX_CONNECTIONS):
+        """
+        Args:
+            api_key: Hume API key
+            max_connections: Connections kept in the pool, open or idle
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="hume-client-loop", daemon=True)
+        self._thread.start()
+        self._http = httpx.AsyncClient(
+            timeout=self.READ_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=self.KEEPALIVE_EXPIRY
+            )
+        )
+        self.client = AsyncHumeClient(api_key=api_key, httpx_client=self._http)
+        self._closed = False
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """
+        Run a coroutine on the pool's loop and wait for its result.
+        Must not be called from the pool's own loop.
+        """
+        if self._closed:
+            coro.close()
+            raise RuntimeError("Hume client pool is closed")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def arun(self, coro: Awaitable[T]) -> T:
+        """Await a coroutine on the pool's loop from any event loop; cancelling the caller cancels it."""
+        if self._closed:
+            coro.close()
+            raise RuntimeError("Hume client pool is closed")
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    async def _shutdown(self) -> None:
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._http.aclose()
+
+    def close(self) -> None:
+        """Cancel calls in progress, close the connections and stop the loop thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+            self.loop.close()
+
+_hume_pools: Dict[str, HumeClientPool] = {}
+_hume_pools_pid: Optional[int] = None
+_hume_pools_lock = threading.Lock()
+
+def get_hume_pool(api_key: str) -> HumeClientPool:
+    """
+    Return the process-wide HumeClientPool for an API key, creating it on first use.
+    A forked child gets its own pool rather than sharing the parent's loop thread.
+    """
+    global _hume_pools_pid
+    with _hume_pools_lock:
+        if _hume_pools_pid != os.getpid():
+            _hume_pools.clear()
+            _hume_pools_pid = os.getpid()
+        if api_key not in _hume_pools:
+            _hume_pools[api_key] = HumeClientPool(api_key)
+        return _hume_pools[api_key]
+
+def close_hume_pools() -> None:
+    """Close the process-wide Hume client pools; the next call to get_hume_pool creates a new one."""
+    global _hume_pools_pid
+    with _hume_pools_lock:
+        if _hume_pools_pid == os.getpid():
+            for pool in _hume_pools.values():
+                pool.close()
+        _hume_pools.clear()
+        _hume_pools_pid = None
+
+atexit.register(close_hume_pools)
+
 class HumeTTS:
     MAX_CHARS = 4800  # Setting slightly below 5000 for safety
     MAX_RETRIES = 3
     INITIAL_WAIT = 2  # Initial wait time in seconds
     MAX_WAIT = 10  # Maximum wait time in seconds
     TIMEOUT = 240  # Timeout in seconds
+    MAX_CONCURRENCY = 4  # Chunks synthesized at once, when Django settings (HUME_CHUNK_CONCURRENCY) are not available
 
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            max_concurrency: Chunks of one text synthesized at once (default: HUME_CHUNK_CONCURRENCY setting)
+        """
+        self.max_concurrency = max_concurrency or _configured_concurrency(self.MAX_CONCURRENCY)
         load_dotenv()
         self.api_key = os.getenv("HUME_API_KEY")
         if not self.api_key:
@@ -191,7 +312,7 @@ class HumeTTS:
         Returns:
             bytes: The audio data in bytes
         """
-        client = AsyncHumeClient(api_key=self.api_key)
+        pool = get_hume_pool(self.api_key)
         
         try:
             # Select appropriate voice description based on content
@@ -200,17 +321,19 @@ class HumeTTS:
             print(f"Processing{chunk_info} with voice: {voice_description}")
             
             # Generate audio using TTS API with timeout
-            result = await asyncio.wait_for(
-                client.tts.synthesize_json(
-                    utterances=[
-                        PostedUtterance(
-                            text=text,
-                            description=voice_description
-                        )
-                    ]
-                ),
-                timeout=self.TIMEOUT
-            )
+            async with aoutbound_call("hume"):
+                with track("tts_chunk"):
+                    result = await asyncio.wait_for(
+                        pool.arun(pool.client.tts.synthesize_json(
+                            utterances=[
+                                PostedUtterance(
+                                    text=text,
+                                    description=voice_description
+                                )
+                            ]
+                        )),
+                        timeout=self.TIMEOUT
+                    )
             
             if not result or not result.generations or not result.generations[0].audio:
                 raise RuntimeError("No audio generated")
@@ -232,50 +355,46 @@ class HumeTTS:
         """
         Process text chunks and combine them into a single audio file
         
+        Up to `max_concurrency` chunks are synthesized at once, each with its
+        own retries; the audio is joined in chunk order. If a chunk still
+        fails after its retries, the chunks in progress are cancelled.
+        
         Args:
             chunks (List[str]): List of text chunks to process
             output_path (Path): Directory for output files
             output_file (Path): Final output file path
         """
-        combined_audio = None
-        
-        for i, chunk in enumerate(chunks):
-            try:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def synthesize(i: int, chunk: str) -> AudioSegment:
+            async with semaphore:
                 print(f"Processing chunk {i+1}/{len(chunks)}")
                 audio_data = await self._generate_audio_with_retry(chunk, i)
-                
-                # Save temporary file
-                temp_file = output_path / f"temp_{i}.mp3"
-                with open(temp_file, 'wb') as f:
-                    f.write(audio_data)
-                
-                # Load audio segment
-                audio_segment = AudioSegment.from_mp3(temp_file)
-                
-                # Add to combined audio
-                if combined_audio is None:
-                    combined_audio = audio_segment
-                else:
-                    # Add a small pause between chunks
-                    combined_audio += AudioSegment.silent(duration=500) + audio_segment
-                
-                # Clean up temp file
-                os.remove(temp_file)
-                
-            except Exception as e:
-                print(f"Error processing chunk {i+1}: {str(e)}")
-                # Clean up any temporary files
-                temp_files = list(output_path.glob("temp_*.mp3"))
-                for temp_file in temp_files:
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
-                raise
+            return await asyncio.to_thread(AudioSegment.from_file, io.BytesIO(audio_data), format="mp3")
+
+        tasks = [asyncio.create_task(synthesize(i, chunk)) for i, chunk in enumerate(chunks)]
+        try:
+            segments = await asyncio.gather(*tasks)
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                logger.exception("Error processing chunks")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        combined_audio = None
+        for audio_segment in segments:
+            if combined_audio is None:
+                combined_audio = audio_segment
+            else:
+                # Add a small pause between chunks
+                combined_audio += AudioSegment.silent(duration=500) + audio_segment
 
         # Export combined audio
         if combined_audio is not None:
-            combined_audio.export(output_file, format="mp3")
+            with track("audio_export"):
+                await asyncio.to_thread(combined_audio.export, output_file, format="mp3")
         else:
             raise RuntimeError("Failed to generate combined audio")
 
@@ -283,6 +402,22 @@ class HumeTTS:
         """
         Convert text to speech using Hume AI Text to Speech API
         
+        Runs on the shared HumeClientPool loop, so no event loop is created per call.
+        
+        Args:
+            text (str): The text to convert to speech
+            output_dir (str): Directory to store the audio output
+            filename (str): Optional filename for the output file
+            
+        Returns:
+            str: Path to the generated audio file
+        """
+        return get_hume_pool(self.api_key).run(self.text_to_speech_async(text, output_dir, filename))
+
+    async def text_to_speech_async(self, text: str, output_dir: str = "audio_outputs", filename: str | None = None) -> str:
+        """
+        Async version of text_to_speech, for callers already running an event loop
+        
         Args:
             text (str): The text to convert to speech
             output_dir (str): Directory to store the audio output
@@ -308,16 +443,24 @@ class HumeTTS:
         
         if len(chunks) == 1:
             # If only one chunk, generate audio directly
-            audio_data = asyncio.run(self._generate_audio_with_retry(chunks[0]))
+            audio_data = await self._generate_audio_with_retry(chunks[0])
             with open(output_file, 'wb') as f:
                 f.write(audio_data)
         else:
             # If multiple chunks, generate audio for each and concatenate
             print(f"Text split into {len(chunks)} chunks")
-            asyncio.run(self._process_chunks(chunks, output_path, output_file))
+            await self._process_chunks(chunks, output_path, output_file)
         
         return str(output_file)
 
+def _configured_concurrency(default: int) -> int:
+    try:
+        from django.conf import settings
+        return getattr(settings, "HUME_CHUNK_CONCURRENCY", default)
+    except Exception:
+        # Run outside Django, e.g. this module's __main__
+        return default
+
 if __name__ == "__main__":
     # Example usage
     input_file = "video_description.txt"
@@ -1,107 +1,1048 @@
+import asyncio
+import atexit
 import cv2
-import base64
+import logging
 import os
-from typing import List, Optional
+from typing import Any, Awaitable, ContextManager, Dict, Iterable, Iterator, List, Optional, TypeVar
+import numpy as np
+import multiprocessing
+import queue
+import shutil
+import tempfile
+import threading
 import time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import sys
 from django.conf import settings
+from metrics import track
+from outbound import aoutbound_call, outbound_call
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 class VideoProcessor:
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the VideoProcessor with Gemini client."""
+    MODEL_NAME = 'models/gemini-2.5-flash'
+    PROMPT_VERSION = 1  # Bump when the prompts change so cached descriptions are regenerated
+    SEEK_THRESHOLD = 90  # Gaps (in frames) above this are skipped by seeking instead of grabbing
+    STREAM_MIN_COVERAGE = 0.9  # Share of planned frames a stream must deliver to count as complete
+    STREAM_BUFFER_CHUNKS = 256  # Streamed text chunks held for a slow reader; more than a description has
+
+    # Prompt for describing the whole video in one request
+    # prompt = """These are frames from a video that I want to upload. 
+    # Generate only one compelling description that I can upload along with the 
+    # video. Description should describe every detail in the video. This will 
+    # be narrated for people who can not see as a story, so it should be very 
+    # interesting and engaging. This should be like a book. Start right into the 
+    # story. You can descript the scence like a book, but do not anything like The 
+    # scene opens on that makes it not like the story."""
+    DESCRIPTION_PROMPT = """These are frames from a video that I want to upload. 
+        Generate only one lively andcompelling text script that I can upload along with the 
+        video. The script should describe every detail in the video. This will 
+        be narrated for people who can not see as a lively story and radio drama, so it should be very 
+        interesting and engaging. Start right into the story. You can describ the scene like a book, but do not anything like The 
+        scene opens on that makes it not like the story. Do not be too long or too short."""
+    #You can add soound effects 
+    #and wrap around with [], like [gunshot], [applause], [clapping], [explosion], 
+    #[swallows], [gulps] ...
+
+    # Prompts for segmented (map-reduce) description of long videos
+    SEGMENT_PROMPT = """These are frames from part {part} of {total} of a video, in order. 
+        Narrate exactly what happens in this part for people who can not see, as a lively 
+        story. Describe every important detail, character and action. Do not add an 
+        introduction or a conclusion, since other parts come before and after this one."""
+    MERGE_PROMPT = """Below are narrations of consecutive parts of one video, in order. 
+        Stitch them into only one lively and compelling text script that will be narrated 
+        for people who can not see as a lively story and radio drama. Keep every important 
+        detail, remove repetition between parts and make the transitions smooth. Start right 
+        into the story and do not mention the parts. Do not be too long or too short."""
+
+    GENERATION_CONFIG = {
+        "temperature": 0.4,
+        "top_p": 1,
+        "top_k": 32,
+        "max_output_tokens": 10000,
+    }
+    SAFETY_SETTINGS = {
+        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+    }
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_dimension: Optional[int] = None,
+        jpeg_quality: int = 95,
+        payload_budget: Optional[int] = None,
+    ):
+        """
+        Initialize the VideoProcessor with Gemini client.
+        
+        Args:
+            api_key: Google API key (defaults to settings.GOOGLE_API_KEY)
+            max_dimension: Longest side in pixels for encoded frames (optional)
+            jpeg_quality: JPEG quality for encoded frames, 0-100 (default: 95)
+            payload_budget: Maximum total size in bytes of the frames sent to Gemini (optional)
+        """
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.payload_budget = payload_budget
         self.api_key = api_key or settings.GOOGLE_API_KEY
         if not self.api_key:
             raise ValueError("Google API key is required")
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        # Decoding processes are started on first use and kept for later videos
+        self._decode_executor: Optional[ProcessPoolExecutor] = None
+        self._decode_workers = 0
+        self._decode_lock = threading.Lock()
+    
+    def close(self) -> None:
+        """Close the Gemini client and its connections, and stop the decoding processes."""
+        # The model creates its client lazily on the first request
+        client = getattr(self.model, "_client", None)
+        if client is not None:
+            client.transport.close()
+        with self._decode_lock:
+            executor, self._decode_executor = self._decode_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
         
-    def extract_frames(self, video_path: str, frame_interval: int = 5) -> List[str]:
+    def extract_frames(
+        self,
+        video_path: str,
+        frame_interval: int = 5,
+        frames_per_minute: Optional[float] = None,
+        max_frames: Optional[int] = None,
+    ) -> List[bytes]:
         """
-        Extract frames from a video file and convert them to base64.
+        Extract frames from a video file as JPEG bytes.
+        
+        Collects everything `iter_frames` yields; see there for how frames
+        are sampled.
         
         Args:
             video_path: Path to the video file
             frame_interval: Interval between frames to extract (default: 5)
+            frames_per_minute: Target sampling rate in frames per minute (optional)
+            max_frames: Maximum number of frames to extract (optional)
             
         Returns:
-            List of base64 encoded frames
+            List of JPEG encoded frames
+        """
+        return list(self.iter_frames(video_path, frame_interval, frames_per_minute, max_frames))
+    
+    def iter_frames(
+        self,
+        video_path: str,
+        frame_interval: int = 5,
+        frames_per_minute: Optional[float] = None,
+        max_frames: Optional[int] = None,
+        workers: int = 1,
+        parallel_min_seconds: float = 300,
+    ) -> Iterator[bytes]:
+        """
+        Yield JPEG encoded frames from a video file one at a time.
+        
+        Frames are sampled either every `frame_interval` frames or, when
+        `frames_per_minute` is given, at that rate based on the stream's fps.
+        `max_frames` caps the total by spreading samples evenly over the video.
+        Skipped frames are passed over with grab() or a seek, so only the
+        sampled frames are ever fully decoded.
+        
+        With `workers` > 1, videos of at least `parallel_min_seconds` are split
+        into time ranges that are decoded in a process pool, each worker with
+        its own capture. Frames are still yielded in playback order.
+        
+        Args:
+            video_path: Path to the video file
+            frame_interval: Interval between frames to extract (default: 5)
+            frames_per_minute: Target sampling rate in frames per minute (optional)
+            max_frames: Maximum number of frames to extract (optional)
+            workers: Number of decoding processes (default: 1, sequential)
+            parallel_min_seconds: Shortest video worth decoding in parallel (default: 300)
+            
+        Yields:
+            JPEG encoded frames in playback order
         """
         video = cv2.VideoCapture(video_path)
-        base64_frames = []
-        frame_count = 0
+        try:
+            fps = video.get(cv2.CAP_PROP_FPS) or 0
+            total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            step = self._sampling_step(fps, total_frames, frame_interval, frames_per_minute, max_frames)
+            indices = self._sample_indices(total_frames, step, max_frames)
+            
+            duration = total_frames / fps if fps > 0 else 0
+            if workers <= 1 or total_frames <= 0 or duration < parallel_min_seconds:
+                yield from _read_frames(video, indices, self.max_dimension, self.jpeg_quality)
+                return
+        finally:
+            video.release()
         
-        while video.isOpened():
-            success, frame = video.read()
-            if not success:
-                break
-                
-            # Only keep frames at the specified interval
-            if frame_count % frame_interval == 0:
-                _, buffer = cv2.imencode(".jpg", frame)
-                base64_frames.append(base64.b64encode(buffer).decode("utf-8"))
+        yield from self._iter_frames_parallel(video_path, list(indices), workers)
+    
+    def iter_stream_frames(
+        self,
+        source: str,
+        fps: Optional[float],
+        duration: Optional[float],
+        frame_interval: int = 5,
+        frames_per_minute: Optional[float] = None,
+        max_frames: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """
+        Yield JPEG encoded frames from a stream that cannot seek, such as a
+        GrowingFilePipe fed by a download that is still in progress.
+        
+        A stream does not report its frame count, so sampling is planned from
+        the `fps` and `duration` the caller knows from elsewhere (e.g. the
+        site's metadata) and frames are walked in order with grab(). Containers
+        that keep their index at the end of the file cannot be read this way;
+        the capture then fails to open or stops early, and IncompleteStreamError
+        is raised so the caller can fall back to iter_frames on the finished file.
+        
+        Args:
+            source: Path or URL of the stream
+            fps: Frame rate of the video, if known
+            duration: Length of the video in seconds, if known
+            frame_interval: Interval between frames to extract (default: 5)
+            frames_per_minute: Target sampling rate in frames per minute (optional)
+            max_frames: Maximum number of frames to extract (optional)
             
-            frame_count += 1
+        Yields:
+            JPEG encoded frames in playback order
             
-        video.release()
-        return base64_frames
+        Raises:
+            IncompleteStreamError: If the stream could not be opened or ended
+                before STREAM_MIN_COVERAGE of the planned frames were read
+        """
+        video = cv2.VideoCapture(source, cv2.CAP_FFMPEG)
+        try:
+            if not video.isOpened():
+                raise IncompleteStreamError(f"Could not open stream {source}")
+            fps = video.get(cv2.CAP_PROP_FPS) or fps or 0
+            total_frames = int(duration * fps) if duration and fps else 0
+            step = self._sampling_step(fps, total_frames, frame_interval, frames_per_minute, max_frames)
+            indices = self._sample_indices(total_frames, step, max_frames)
+            if total_frames > 0:
+                indices = list(indices)
+            expected = len(indices) if total_frames > 0 else 0
+            
+            count = 0
+            for frame in _read_frames(video, indices, self.max_dimension, self.jpeg_quality, seekable=False):
+                count += 1
+                yield frame
+            if count == 0 or count < expected * self.STREAM_MIN_COVERAGE:
+                raise IncompleteStreamError(f"Stream ended after {count} of {expected} frames")
+        finally:
+            video.release()
     
-    def generate_description(self, frames: List[str]) -> str:
+    def _iter_frames_parallel(self, video_path: str, indices: List[int], workers: int) -> Iterator[bytes]:
         """
-        Generate a description of the video using Gemini Vision.
+        Decode contiguous ranges of the sampled indices in a process pool.
         
         Args:
-            frames: List of base64 encoded frames
+            video_path: Path to the video file
+            indices: Sorted frame indices to extract
+            workers: Number of decoding processes
+            
+        Yields:
+            JPEG encoded frames in playback order
+        """
+        segment_size = -(-len(indices) // workers)
+        segments = [indices[i:i + segment_size] for i in range(0, len(indices), segment_size)]
+        logger.debug(f"Decoding {len(indices)} frames in {len(segments)} segments")
+        
+        executor = self._decode_pool(workers)
+        futures = [
+            executor.submit(_extract_segment, video_path, segment, self.max_dimension, self.jpeg_quality)
+            for segment in segments
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        except BrokenProcessPool:
+            # A decoding process died; start a fresh pool for the next video
+            with self._decode_lock:
+                if self._decode_executor is executor:
+                    self._decode_executor = None
+            executor.shutdown(wait=False)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    def _decode_pool(self, workers: int) -> ProcessPoolExecutor:
+        """
+        Return the process pool used for parallel decoding, starting it on first use.
+        
+        Starting a process costs an interpreter start and the cv2 import, so the
+        pool is shared by every video this processor decodes and stopped by `close`.
+        
+        Args:
+            workers: Number of decoding processes the caller needs
             
         Returns:
-            Generated description text
+            A pool with at least `workers` processes
+        """
+        with self._decode_lock:
+            executor = self._decode_executor
+            if executor is None or self._decode_workers < workers:
+                if executor is not None:
+                    executor.shutdown(wait=False)  # Jobs already submitted still finish
+                # Spawn rather than fork: the caller usually runs on a FrameBuffer thread
+                context = multiprocessing.get_context("spawn")
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                self._decode_executor = executor
+                self._decode_workers = workers
+            return executor
+    
+    @staticmethod
+    def _sampling_step(
+        fps: float,
+        total_frames: int,
+        frame_interval: int,
+        frames_per_minute: Optional[float],
+        max_frames: Optional[int],
+    ) -> float:
+        """
+        Work out the distance in frames between two sampled frames.
+        
+        Args:
+            fps: Frame rate reported by the stream (0 if unknown)
+            total_frames: Frame count reported by the stream (0 if unknown)
+            frame_interval: Fallback interval when no rate can be derived
+            frames_per_minute: Target sampling rate in frames per minute (optional)
+            max_frames: Maximum number of frames to extract (optional)
+            
+        Returns:
+            Sampling step in frames (may be fractional)
+        """
+        step = float(max(frame_interval, 1))
+        if frames_per_minute and fps > 0:
+            step = max(fps * 60 / frames_per_minute, 1.0)
+        
+        # Widen the step so the whole video fits in the frame budget
+        if max_frames and total_frames > 0:
+            step = max(step, total_frames / max_frames)
+        
+        return step
+    
+    @staticmethod
+    def _sample_indices(total_frames: int, step: float, max_frames: Optional[int]) -> Iterator[int]:
+        """
+        Yield the indices of the frames to keep, in increasing order.
+        
+        When the stream does not report a frame count, indices are yielded
+        until the reader runs out of frames or `max_frames` is reached.
+        
+        Args:
+            total_frames: Frame count reported by the stream (0 if unknown)
+            step: Sampling step in frames
+            max_frames: Maximum number of indices to yield (optional)
+        """
+        count = 0
+        last = -1
+        while not max_frames or count < max_frames:
+            index = int(round(count * step))
+            if total_frames > 0 and index >= total_frames:
+                return
+            count += 1
+            if index == last:
+                continue
+            last = index
+            yield index
+    
+    def build_image_parts(self, frames: Iterable[bytes]) -> List[Dict[str, Any]]:
+        """
+        Build the Gemini image parts for a stream of frames.
+        
+        Frames are consumed one at a time, so this can read straight from an
+        `iter_frames` generator or a `FrameBuffer`. The JPEG bytes go into the
+        parts as they are; the SDK applies base64 only if its transport needs it.
+        
+        Args:
+            frames: JPEG encoded frames
+            
+        Returns:
+            List of image parts for the Gemini request
         """
-        # Convert base64 frames to image parts
         image_parts = []
         for frame in frames:
             image_parts.append({
                 "mime_type": "image/jpeg",
                 "data": frame
             })
+        return self._fit_payload_budget(image_parts)
+    
+    def _fit_payload_budget(self, image_parts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Drop evenly spaced frames until the payload fits in `payload_budget`.
         
-        # Create the prompt
-        # prompt = """These are frames from a video that I want to upload. 
-        # Generate only one compelling description that I can upload along with the 
-        # video. Description should describe every detail in the video. This will 
-        # be narrated for people who can not see as a story, so it should be very 
-        # interesting and engaging. This should be like a book. Start right into the 
-        # story. You can descript the scence like a book, but do not anything like The 
-        # scene opens on that makes it not like the story."""
-        prompt = """These are frames from a video that I want to upload. 
-        Generate only one lively andcompelling text script that I can upload along with the 
-        video. The script should describe every detail in the video. This will 
-        be narrated for people who can not see as a lively story and radio drama, so it should be very 
-        interesting and engaging. Start right into the story. You can describ the scene like a book, but do not anything like The 
-        scene opens on that makes it not like the story. Do not be too long or too short."""
-        #You can add soound effects 
-        #and wrap around with [], like [gunshot], [applause], [clapping], [explosion], 
-        #[swallows], [gulps] ...
-        
-        # Generate content using Gemini
-        response = self.model.generate_content(
-            contents=[prompt] + image_parts,
-            generation_config={
-                "temperature": 0.4,
-                "top_p": 1,
-                "top_k": 32,
-                "max_output_tokens": 10000,
-            },
-            safety_settings={
-                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-            }
+        Thinning across the whole list keeps the full length of the video
+        covered instead of cutting off its end.
+        
+        Args:
+            image_parts: Image parts in playback order
+            
+        Returns:
+            Image parts whose total size is within the budget; if no single
+            frame fits, the smallest frame alone
+        """
+        total = self.payload_size(image_parts)
+        if not self.payload_budget or total <= self.payload_budget:
+            return image_parts
+        
+        sizes = [len(part["data"]) for part in image_parts]
+        keep_count = int(len(image_parts) * self.payload_budget / total)
+        while keep_count > 0:
+            keep = np.unique(np.linspace(0, len(image_parts) - 1, keep_count).round().astype(int))
+            if sum(sizes[i] for i in keep) <= self.payload_budget:
+                logger.debug(f"Payload budget: kept {len(keep)} of {len(image_parts)} frames")
+                return [image_parts[i] for i in keep]
+            keep_count -= 1
+        
+        # Describing from one oversized frame beats failing as if no frames were extracted
+        smallest = min(range(len(sizes)), key=sizes.__getitem__)
+        logger.debug(f"Payload budget: no frame fits, kept frame {smallest} ({sizes[smallest]} bytes)")
+        return [image_parts[smallest]]
+    
+    @staticmethod
+    def payload_size(image_parts: List[Dict[str, Any]]) -> int:
+        """
+        Total size in bytes of the frame data in a list of image parts.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            
+        Returns:
+            Payload size in bytes
+        """
+        return sum(len(part["data"]) for part in image_parts)
+    
+    def generate_description(self, frames: Iterable[bytes]) -> str:
+        """
+        Generate a description of the video using Gemini Vision.
+        
+        Args:
+            frames: JPEG encoded frames
+            
+        Returns:
+            Generated description text
+        """
+        return self.generate_description_from_parts(self.build_image_parts(frames))
+    
+    def generate_description_from_parts(self, image_parts: List[Dict[str, Any]]) -> str:
+        """
+        Generate a description of the video from prepared image parts.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            
+        Returns:
+            Generated description text
+        """
+        return self._generate([self.DESCRIPTION_PROMPT] + image_parts)
+    
+    def generate_description_segmented(
+        self,
+        image_parts: List[Dict[str, Any]],
+        window_size: int = 60,
+        max_concurrency: int = 4,
+    ) -> str:
+        """
+        Generate a description of a long video in map-reduce fashion.
+        
+        The frames are split into consecutive windows of `window_size` frames
+        (equal stretches of time, since frames are sampled evenly; see
+        `split_windows`). Each window
+        is narrated by its own Gemini request, at most `max_concurrency` at a
+        time, and a final text-only request merges the partial narrations into
+        one script.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            window_size: Number of frames per window (default: 60)
+            max_concurrency: Maximum number of concurrent Gemini requests (default: 4)
+            
+        Returns:
+            Generated description text
+        """
+        windows = self.split_windows(image_parts, window_size)
+        if len(windows) == 1:
+            return self.generate_description_from_parts(image_parts)
+        return self._generate([self._narrate_windows(windows, max_concurrency)])
+    
+    def stream_description(
+        self,
+        image_parts: List[Dict[str, Any]],
+        window_size: Optional[int] = None,
+        max_concurrency: int = 4,
+        slot: Optional[ContextManager] = None,
+    ) -> Iterator[str]:
+        """
+        Generate a description and yield its text as Gemini produces it.
+        
+        With `window_size` set and frames for more than one window, the windows are
+        narrated as in `generate_description_segmented` and only the final
+        merge is streamed.
+        
+        The response is read on a background thread into a bounded buffer, so
+        the outbound slot (and `slot`) are held while Gemini generates rather
+        than for as long as a slow reader takes to consume the text.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            window_size: Number of frames per window for long videos (optional)
+            max_concurrency: Maximum number of concurrent Gemini requests (default: 4)
+            slot: Context manager held while the description is generated, such as an admission slot (optional)
+            
+        Yields:
+            Chunks of the description text
+        """
+        def generate() -> Iterator[str]:
+            with slot or nullcontext():
+                windows = self.split_windows(image_parts, window_size) if window_size else [image_parts]
+                if len(windows) > 1:
+                    contents = [self._narrate_windows(windows, max_concurrency)]
+                else:
+                    contents = [self.DESCRIPTION_PROMPT] + image_parts
+                
+                with outbound_call("gemini"), track("gemini"):
+                    for chunk in self._request(contents, stream=True):
+                        if chunk.parts:
+                            yield chunk.text
+        
+        with FrameBuffer(generate(), maxsize=self.STREAM_BUFFER_CHUNKS) as buffer:
+            yield from buffer
+    
+    @staticmethod
+    def split_windows(image_parts: List[Dict[str, Any]], window_size: int) -> List[List[Dict[str, Any]]]:
+        """
+        Split the frames into consecutive windows of `window_size` frames.
+        
+        A last window of less than half `window_size` frames is folded into
+        the one before it, so a video just over a window long is described in
+        one request rather than with an extra call for a few frames.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            window_size: Number of frames per window
+            
+        Returns:
+            The windows, in order; a single window when the frames fit in one
+        """
+        windows = [image_parts[i:i + window_size] for i in range(0, len(image_parts), window_size)]
+        if len(windows) > 1 and len(windows[-1]) < window_size / 2:
+            windows[-2:] = [windows[-2] + windows[-1]]
+        return windows or [image_parts]
+    
+    def _narrate_windows(self, windows: List[List[Dict[str, Any]]], max_concurrency: int) -> str:
+        """
+        Narrate consecutive windows of frames concurrently.
+        
+        Args:
+            windows: Windows of image parts from `split_windows`
+            max_concurrency: Maximum number of concurrent Gemini requests
+            
+        Returns:
+            Merge prompt followed by the partial narrations, in order
+        """
+        def describe_window(index: int) -> str:
+            prompt = self.SEGMENT_PROMPT.format(part=index + 1, total=len(windows))
+            return self._generate([prompt] + windows[index])
+        
+        logger.debug(f"Describing {len(windows)} windows with up to {max_concurrency} concurrent requests")
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            partials = list(executor.map(describe_window, range(len(windows))))
+        
+        return self._merge_prompt(partials)
+    
+    def _merge_prompt(self, partials: List[str]) -> str:
+        """
+        Build the merge request text from the partial narrations.
+        
+        Args:
+            partials: Narration of each window, in order
+            
+        Returns:
+            Merge prompt followed by the partial narrations
+        """
+        narration = "\n\n".join(
+            f"Part {i + 1}:\n{partial}" for i, partial in enumerate(partials)
+        )
+        return self.MERGE_PROMPT + "\n\n" + narration
+    
+    async def generate_description_async(
+        self,
+        image_parts: List[Dict[str, Any]],
+        window_size: Optional[int] = None,
+        max_concurrency: int = 4,
+    ) -> str:
+        """
+        Async version of `generate_description_from_parts`, or of
+        `generate_description_segmented` when `window_size` is set.
+        
+        The Gemini requests run on the process-wide Gemini event loop (see
+        `get_gemini_loop`) instead of blocking a thread each.
+        
+        Args:
+            image_parts: Image parts built by `build_image_parts`
+            window_size: Number of frames per window for long videos (optional)
+            max_concurrency: Maximum number of concurrent Gemini requests (default: 4)
+            
+        Returns:
+            Generated description text
+        """
+        windows = self.split_windows(image_parts, window_size) if window_size else [image_parts]
+        if len(windows) == 1:
+            return await self._generate_async([self.DESCRIPTION_PROMPT] + image_parts)
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def describe_window(index: int) -> str:
+            prompt = self.SEGMENT_PROMPT.format(part=index + 1, total=len(windows))
+            async with semaphore:
+                return await self._generate_async([prompt] + windows[index])
+        
+        logger.debug(f"Describing {len(windows)} windows with up to {max_concurrency} concurrent requests")
+        partials = await asyncio.gather(*(describe_window(i) for i in range(len(windows))))
+        return await self._generate_async([self._merge_prompt(partials)])
+    
+    def _generate(self, contents: List[Any]) -> str:
+        """
+        Send one generate_content request to Gemini.
+        
+        Args:
+            contents: Prompt text followed by any image parts
+            
+        Returns:
+            Generated text
+        """
+        with outbound_call("gemini"), track("gemini"):
+            return self._request(contents).text
+    
+    def _request(self, contents: List[Any], stream: bool = False):
+        """
+        Call generate_content with the shared generation and safety settings.
+        
+        Args:
+            contents: Prompt text followed by any image parts
+            stream: Whether to stream the response (default: False)
+            
+        Returns:
+            Gemini response, iterable over chunks when streaming
+        """
+        return self.model.generate_content(
+            contents=contents,
+            stream=stream,
+            generation_config=self.GENERATION_CONFIG,
+            safety_settings=self.SAFETY_SETTINGS
         )
+    
+    async def _generate_async(self, contents: List[Any]) -> str:
+        """
+        Send one generate_content request to Gemini without blocking the event loop.
         
+        Args:
+            contents: Prompt text followed by any image parts
+            
+        Returns:
+            Generated text
+        """
+        async with aoutbound_call("gemini"):
+            with track("gemini"):
+                response = await _run_on_gemini_loop(self.model.generate_content_async(
+                    contents=contents,
+                    generation_config=self.GENERATION_CONFIG,
+                    safety_settings=self.SAFETY_SETTINGS
+                ))
         return response.text
 
+@track("jpeg_encode")
+def _encode_frame(frame: np.ndarray, max_dimension: Optional[int], jpeg_quality: int) -> bytes:
+    """
+    Downscale a decoded frame to `max_dimension` and encode it as JPEG.
+    
+    Args:
+        frame: Decoded BGR frame
+        max_dimension: Longest side in pixels (optional)
+        jpeg_quality: JPEG quality, 0-100
+        
+    Returns:
+        JPEG bytes
+    """
+    height, width = frame.shape[:2]
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    
+    _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    return buffer.tobytes()
+
+def _read_frames(
+    video: cv2.VideoCapture,
+    indices: Iterable[int],
+    max_dimension: Optional[int],
+    jpeg_quality: int,
+    seekable: bool = True,
+) -> Iterator[bytes]:
+    """
+    Read and encode the frames at the given indices from an open capture.
+    
+    Long gaps are skipped with a seek and short ones with grab(), so the
+    frames in between are never retrieved.
+    
+    Args:
+        video: Open capture positioned at the start of the video
+        indices: Increasing frame indices to read
+        max_dimension: Longest side in pixels (optional)
+        jpeg_quality: JPEG quality, 0-100
+        seekable: Whether long gaps may be skipped with a seek; streams such
+            as pipes are always walked with grab()
+        
+    Yields:
+        JPEG encoded frames
+    """
+    position = 0
+    for index in indices:
+        gap = index - position
+        if seekable and gap > VideoProcessor.SEEK_THRESHOLD:
+            # Jump straight to the target so the skipped frames are never decoded
+            video.set(cv2.CAP_PROP_POS_FRAMES, index)
+        else:
+            # Short gaps are cheaper to walk with grab(), which skips the retrieve step
+            skipped = 0
+            while skipped < gap and video.grab():
+                skipped += 1
+            if skipped < gap:
+                break
+        
+        success, frame = video.read()
+        if not success:
+            break
+        position = index + 1
+        
+        yield _encode_frame(frame, max_dimension, jpeg_quality)
+
+def _extract_segment(
+    video_path: str,
+    indices: List[int],
+    max_dimension: Optional[int],
+    jpeg_quality: int,
+) -> List[bytes]:
+    """
+    Process pool entry point: decode one range of frames with its own capture.
+    
+    Args:
+        video_path: Path to the video file
+        indices: Increasing frame indices in this segment
+        max_dimension: Longest side in pixels (optional)
+        jpeg_quality: JPEG quality, 0-100
+        
+    Returns:
+        JPEG encoded frames of the segment
+    """
+    video = cv2.VideoCapture(video_path)
+    try:
+        return list(_read_frames(video, indices, max_dimension, jpeg_quality))
+    finally:
+        video.release()
+
+class IncompleteStreamError(RuntimeError):
+    """A stream could not be decoded to the end; decode the finished file instead."""
+
+class GrowingFilePipe:
+    """
+    Named pipe fed from a file that is still being written.
+
+    A background thread copies the file into the pipe as it grows, so a
+    decoder can read it as a stream before the writer is done, without
+    ever seeing the end of the file early. Call `finish` once the writer
+    has closed the file: the remaining bytes are copied and the pipe is
+    closed, which the reader sees as end of stream.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = 1 << 16, poll_interval: float = 0.05):
+        """
+        Args:
+            file_path: File being written; it may not exist yet
+            chunk_size: Bytes copied per read
+            poll_interval: Seconds to wait for more data when the copy catches up
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.bytes_copied = 0
+        self._dir = tempfile.mkdtemp(prefix="blindtube-pipe-")
+        self.path = os.path.join(self._dir, "stream")
+        os.mkfifo(self.path)
+        self._finished = threading.Event()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._copy, daemon=True)
+        self._thread.start()
+
+    def finish(self) -> None:
+        """The writer is done; close the pipe once everything has been copied."""
+        self._finished.set()
+
+    def _copy(self) -> None:
+        try:
+            # Opening blocks until the reader opens the other end (or close() does)
+            with open(self.path, "wb") as pipe:
+                while not os.path.exists(self.file_path):
+                    if self._closed.is_set() or self._finished.is_set():
+                        return
+                    time.sleep(self.poll_interval)
+                with open(self.file_path, "rb") as source:
+                    while not self._closed.is_set():
+                        chunk = source.read(self.chunk_size)
+                        if chunk:
+                            pipe.write(chunk)
+                            self.bytes_copied += len(chunk)
+                        elif self._finished.is_set():
+                            # The writer may have added a last block between the read and the check
+                            chunk = source.read()
+                            if not chunk:
+                                break
+                            pipe.write(chunk)
+                            self.bytes_copied += len(chunk)
+                        else:
+                            time.sleep(self.poll_interval)
+        except OSError:
+            # The reader closed its end early (BrokenPipeError) or the file went away
+            pass
+
+    def close(self) -> None:
+        """Stop copying and remove the pipe."""
+        self._closed.set()
+        while self._thread.is_alive():
+            try:
+                # Unblock the copy thread if no reader ever opened the pipe
+                os.close(os.open(self.path, os.O_RDONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+            self._thread.join(self.poll_interval)
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+    def __enter__(self) -> "GrowingFilePipe":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class FrameBuffer:
+    """
+    Bounded buffer between frame extraction and the Gemini request builder.
+
+    A background thread pulls frames from the source iterator and blocks
+    once `maxsize` frames are waiting, so decoding runs ahead of the
+    consumer by at most that many frames. Errors raised by the source are
+    re-raised to the consumer. `stream_description` uses it the same way
+    for streamed text chunks.
+    """
+    _DONE = object()
+
+    def __init__(self, frames: Iterable[bytes], maxsize: int = 16):
+        """
+        Args:
+            frames: Source of frames, usually `VideoProcessor.iter_frames`
+            maxsize: Maximum number of frames held in the buffer
+        """
+        self.count = 0  # Frames handed to the consumer so far
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._closed = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._fill, args=(iter(frames),), daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        """Put an item in the queue, giving up if the buffer gets closed."""
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fill(self, frames: Iterator[bytes]) -> None:
+        try:
+            for frame in frames:
+                if not self._put(frame):
+                    break
+        except Exception as e:
+            self._error = e
+        finally:
+            close = getattr(frames, "close", None)
+            if close is not None:
+                close()
+            self._put(self._DONE)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                if self._error is not None:
+                    raise self._error
+                return
+            self.count += 1
+            yield item
+
+    def close(self) -> None:
+        """Stop the producer and drop any buffered frames."""
+        self._closed.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._thread.join()
+
+    def __enter__(self) -> "FrameBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class KeyframeSelector:
+    """
+    Drop frames that are nearly identical to the last kept frame.
+
+    Each frame gets a cheap signature: the JPEG is decoded at 1/8 scale in
+    grayscale and shrunk to a small thumbnail. A frame is kept only when the
+    mean absolute difference to the previous kept thumbnail exceeds the
+    threshold, so static shots collapse to a single frame.
+    """
+    SIGNATURE_SIZE = (32, 32)
+
+    def __init__(self, threshold: float = 0.03, max_frames: Optional[int] = None):
+        """
+        Args:
+            threshold: Minimum mean pixel difference (0-1) for a frame to count as new
+            max_frames: Hard cap on the number of frames kept (optional)
+        """
+        self.threshold = threshold
+        self.max_frames = max_frames
+
+    def signature(self, frame: bytes) -> np.ndarray:
+        """
+        Compute the similarity signature of a JPEG encoded frame.
+        
+        Args:
+            frame: JPEG bytes
+            
+        Returns:
+            Small grayscale thumbnail scaled to the 0-1 range
+        """
+        data = np.frombuffer(frame, dtype=np.uint8)
+        image = cv2.imdecode(data, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        thumbnail = cv2.resize(image, self.SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+        return thumbnail.astype(np.float32) / 255.0
+
+    def select(self, frames: Iterable[bytes]) -> List[bytes]:
+        """
+        Keep only frames that differ enough from the previously kept one.
+        
+        If more than `max_frames` frames survive, they are thinned evenly so
+        the whole video stays covered.
+        
+        Args:
+            frames: JPEG encoded frames in playback order
+            
+        Returns:
+            List of selected JPEG encoded frames
+        """
+        selected = []
+        last_signature = None
+        for frame in frames:
+            signature = self.signature(frame)
+            if last_signature is not None and np.mean(np.abs(signature - last_signature)) < self.threshold:
+                continue
+            last_signature = signature
+            selected.append(frame)
+        
+        if self.max_frames and len(selected) > self.max_frames:
+            keep = np.linspace(0, len(selected) - 1, self.max_frames).round().astype(int)
+            selected = [selected[i] for i in keep]
+        
+        return selected
+
+_shared_processor: Optional[VideoProcessor] = None
+_shared_processor_pid: Optional[int] = None
+_shared_processor_lock = threading.Lock()
+
+def get_shared_processor(**kwargs) -> VideoProcessor:
+    """
+    Return the process-wide VideoProcessor, creating it on first use.
+    
+    Every caller in the worker process reuses the same configured Gemini
+    client and its connections. A forked child gets its own instance
+    rather than sharing the parent's connections.
+    
+    Args:
+        **kwargs: VideoProcessor arguments, used only when the instance is created
+        
+    Returns:
+        The shared VideoProcessor
+    """
+    global _shared_processor, _shared_processor_pid
+    with _shared_processor_lock:
+        if _shared_processor is None or _shared_processor_pid != os.getpid():
+            _shared_processor = VideoProcessor(**kwargs)
+            _shared_processor_pid = os.getpid()
+        return _shared_processor
+
+def close_shared_processor() -> None:
+    """Close the process-wide VideoProcessor; the next call to get_shared_processor creates a new one."""
+    global _shared_processor, _shared_processor_pid
+    with _shared_processor_lock:
+        if _shared_processor is not None and _shared_processor_pid == os.getpid():
+            _shared_processor.close()
+        _shared_processor = None
+        _shared_processor_pid = None
+
+atexit.register(close_shared_processor)
+
+_gemini_loop: Optional[asyncio.AbstractEventLoop] = None
+_gemini_loop_pid: Optional[int] = None
+_gemini_loop_lock = threading.Lock()
+
+def get_gemini_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop that runs async Gemini requests, starting its thread on first use.
+    
+    The SDK creates a single async client per process on the first
+    `generate_content_async` call, and its grpc.aio channel only works on
+    the loop it was created on. Running every async request on this one
+    loop lets callers on any event loop share that client without reaching
+    into the SDK. A forked child starts its own loop.
+    
+    Returns:
+        The running Gemini event loop
+    """
+    global _gemini_loop, _gemini_loop_pid
+    with _gemini_loop_lock:
+        if _gemini_loop is None or _gemini_loop_pid != os.getpid():
+            _gemini_loop = asyncio.new_event_loop()
+            _gemini_loop_pid = os.getpid()
+            threading.Thread(target=_gemini_loop.run_forever, name="gemini-client-loop", daemon=True).start()
+        return _gemini_loop
+
+async def _run_on_gemini_loop(coro: Awaitable[T]) -> T:
+    """Await a coroutine on the Gemini event loop from any event loop; cancelling the caller cancels it."""
+    loop = get_gemini_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
 def main():
     """Example usage of the VideoProcessor class."""
     if len(sys.argv) != 2: